@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from features import MONTH_NAMES, WEEKDAY_NAMES, date_features
+from ingest import memory_bytes, merged_categories
+
+MEASURES = ['Quantity', 'total_price']
+CUBE_KEYS = ['date', 'hour', 'article']
+
+# Сколько частичных агрегатов копится перед слиянием при потоковой загрузке
+MAX_PENDING_PARTS = 8
+
+
+# Квантиль по значениям и их частотам (линейная интерполяция, как в pandas)
+def _weighted_quantile(values, counts, q):
+    cumulative = np.cumsum(counts)
+    position = q * (cumulative[-1] - 1)
+    lower = values[np.searchsorted(cumulative, np.floor(position), side='right')]
+    upper = values[np.searchsorted(cumulative, np.ceil(position), side='right')]
+    return lower + (upper - lower) * (position - np.floor(position))
+
+
+# Агрегатный куб продаж (дата × час × продукт): количество и выручка.
+# Строится один раз на набор данных, все разделы панели получаются его срезами,
+# поэтому размер и стоимость запросов зависят от числа дней и продуктов, а не строк
+class SalesCube:
+
+    def __init__(self):
+        self.cells = pd.DataFrame({
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'hour': pd.Series(dtype='int8'),
+            'article': pd.Series(dtype='category'),
+            'Quantity': pd.Series(dtype='int64'),
+            'total_price': pd.Series(dtype='float64'),
+            'year': pd.Series(dtype='int16'),
+            'month': pd.Series(dtype='int8'),
+            'dow': pd.Series(dtype='int8'),
+        })
+        self.prices = pd.Series(dtype='int64')
+        self.rows = 0
+        self._parts = []
+        self._price_parts = []
+
+    # Куб таблицы строк; части слиты сразу, поэтому общий для сессий куб при чтении
+    # не изменяется (слияние при первом чтении не защищено от одновременных сессий)
+    @classmethod
+    def from_frame(cls, data):
+        cube = cls().update(data)
+        cube._consolidate()
+        return cube
+
+    # Добавление блока строк (вся таблица, очередной блок файла или новая партия)
+    def update(self, chunk):
+        self.rows += len(chunk)
+        keys = [chunk['date'], (chunk['minute'] // 60).astype('int8').rename('hour'), chunk['article']]
+        # Суммы считаются в 64-битных типах, таблица транзакций хранит компактные;
+        # округление убирает погрешность представления цен во float32
+        measures = chunk[MEASURES].astype({'Quantity': 'int64', 'total_price': 'float64'}).round({'total_price': 4})
+        part = measures.groupby(keys, observed=True, sort=False).sum().reset_index()
+        self._parts.append(part)
+        self._price_parts.append(chunk['unit_price'].astype('float64').round(4).value_counts())
+        if len(self._parts) >= MAX_PENDING_PARTS:
+            self._consolidate()
+        return self
+
+    # Слияние накопленных частей в отсортированный по дате куб. Части затрагивают
+    # только даты начиная с самой ранней из них, поэтому пересчитывается лишь хвост куба
+    # (при потоковой загрузке и дозагрузке новых партий он мал)
+    def _consolidate(self):
+        if not self._parts:
+            return
+        parts = pd.concat(self._parts, ignore_index=True)
+        start = self.cells['date'].searchsorted(parts['date'].min())
+        head = self.cells.iloc[:start]
+        tail = pd.concat([self.cells.iloc[start:], parts], ignore_index=True)
+        tail = tail.groupby(CUBE_KEYS, sort=True, observed=True)[MEASURES].sum().reset_index()
+        # Календарные признаки ячеек считаются один раз при слиянии, разделы читают их готовыми
+        tail = tail.assign(**date_features(tail['date']))
+        article = pd.CategoricalDtype(merged_categories(self.cells['article'], tail['article']))
+        self.cells = pd.concat([head.astype({'article': article}), tail.astype({'article': article})],
+                               ignore_index=True)
+        self.prices = pd.concat([self.prices] + self._price_parts).groupby(level=0).sum()
+        self._parts = []
+        self._price_parts = []
+
+    # Независимая копия для дозагрузки партий (ячейки не изменяются на месте, поэтому не копируются)
+    def copy(self):
+        cube = SalesCube()
+        cube.cells = self.cells
+        cube.prices = self.prices
+        cube.rows = self.rows
+        cube._parts = list(self._parts)
+        cube._price_parts = list(self._price_parts)
+        return cube
+
+    # Объём куба в памяти, байт
+    def nbytes(self):
+        return memory_bytes(self._table()) + memory_bytes(self.prices)
+
+    def _table(self):
+        self._consolidate()
+        return self.cells
+
+    # Ячейки за диапазон дат: куб отсортирован по дате, срез находится бинарным поиском
+    def between(self, start_date, end_date):
+        cells = self._table()
+        dates = cells['date'].to_numpy()
+        start = dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), side='left')
+        end = dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), side='right')
+        return cells.iloc[start:end]
+
+    def min_date(self):
+        return self._table()['date'].iloc[0].date()
+
+    def max_date(self):
+        return self._table()['date'].iloc[-1].date()
+
+    def years(self):
+        return self._table()['year'].unique()
+
+    # Продажи по продуктам за период
+    def by_article(self, start_date, end_date):
+        return self.between(start_date, end_date).groupby('article', observed=True)[MEASURES].sum()
+
+    # Топ продуктов по количеству или сумме продаж
+    def top(self, column, start_date, end_date, n=10):
+        return self.by_article(start_date, end_date)[column].nlargest(n).reset_index()
+
+    # Продажи по дням за период
+    def by_day(self, start_date, end_date):
+        return self.between(start_date, end_date).groupby('date')[MEASURES].sum()
+
+    # Выручка по месяцам выбранного года
+    def revenue_by_month(self, year):
+        revenue = self.between(*year_bounds(year)).groupby('month')['total_price'].sum()
+        return pd.DataFrame({'date': MONTH_NAMES[revenue.index.to_numpy()], 'total_price': revenue.to_numpy()})
+
+    # Продажи по часам дня за период
+    def by_hour(self, start_date, end_date):
+        return self.between(start_date, end_date).groupby('hour')[MEASURES].sum()
+
+    # Продажи по дням недели за период (с понедельника, как в хранилище)
+    def by_weekday(self, start_date, end_date):
+        weekly = self.between(start_date, end_date).groupby('dow')[MEASURES].sum()
+        weekly.index = pd.Index(WEEKDAY_NAMES[weekly.index.to_numpy()], name='day_of_week')
+        return weekly
+
+    # Продажи выбранных продуктов по дням
+    def product_daily(self, products, start_date, end_date):
+        cells = self.between(start_date, end_date)
+        cells = cells[cells['article'].isin(products)]
+        return cells.groupby(['article', 'date'], observed=True)['Quantity'].sum().reset_index()
+
+    # Продажи всех продуктов по дням
+    def article_daily(self, start_date, end_date):
+        cells = self.between(start_date, end_date)
+        return cells.groupby(['article', 'date'], observed=True)['Quantity'].sum().reset_index()
+
+    # Описательная статистика цен по частотам значений
+    def price_description(self):
+        return describe_counts(self.price_counts())
+
+    # Частоты цен, упорядоченные по значению
+    def price_counts(self):
+        self._consolidate()
+        return self.prices.sort_index()
+
+
+# Описательная статистика (как Series.describe) по значениям и их частотам.
+# Без значений, как и describe() пустой серии, — число 0, остальное NaN
+def describe_counts(counts):
+    values = counts.index.to_numpy(dtype=float)
+    counts = counts.to_numpy(dtype=float)
+    count = counts.sum()
+    if count == 0:
+        statistics = pd.Series(np.nan, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+                               name='unit_price')
+        statistics['count'] = 0.0
+        return statistics
+    mean = (values * counts).sum() / count
+    std = np.sqrt(((values - mean) ** 2 * counts).sum() / (count - 1)) if count > 1 else np.nan
+    return pd.Series({
+        'count': count,
+        'mean': mean,
+        'std': std,
+        'min': values[0],
+        '25%': _weighted_quantile(values, counts, 0.25),
+        '50%': _weighted_quantile(values, counts, 0.5),
+        '75%': _weighted_quantile(values, counts, 0.75),
+        'max': values[-1],
+    }, name='unit_price')
+
+
+# Первый и последний день года
+def year_bounds(year):
+    return pd.Timestamp(year=int(year), month=1, day=1), pd.Timestamp(year=int(year), month=12, day=31)
+
+
+# Построение куба из потока блоков с отчётом о прогрессе; оставшиеся части сливаются
+# до возврата, как в from_frame, чтобы куб можно было отдать нескольким сессиям
+def build_cube(chunks, on_progress=None):
+    cube = SalesCube()
+    for chunk, done in chunks:
+        cube.update(chunk)
+        if on_progress is not None:
+            on_progress(done)
+    cube._consolidate()
+    return cube
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from features import day_number
+
+# Период недельной сезонности дневного ряда
+WEEK = 7
+
+# Порог робастной оценки остатка (медиана и MAD), выше которого день считается аномальным
+ANOMALY_THRESHOLD = 3.5
+
+# Масштаб MAD к стандартному отклонению нормального распределения
+MAD_SCALE = 1.4826
+
+
+# Центрированное скользящее среднее по строкам; на краях продолжается крайним значением
+def moving_average(matrix, window):
+    length = matrix.shape[1]
+    if length < window:
+        return np.repeat(matrix.mean(axis=1, keepdims=True), length, axis=1)
+    cumulative = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+    valid = (cumulative[:, window:] - cumulative[:, :-window]) / window
+    half = window // 2
+    return np.pad(valid, ((0, 0), (half, window - 1 - half)), mode='edge')
+
+
+# Классическое аддитивное разложение (как seasonal_decompose) сразу для всех строк матрицы
+# (ряд × день): тренд — скользящее среднее за период, сезонность — средний отклонённый
+# от тренда профиль по позиции в периоде, остаток — всё остальное
+def decompose(matrix, period=WEEK):
+    rows, length = matrix.shape
+    trend = moving_average(matrix, period)
+    detrended = matrix - trend
+    padding = (-length) % period
+    cycles = np.pad(detrended, ((0, 0), (0, padding)), constant_values=np.nan).reshape(rows, -1, period)
+    profile = np.nanmean(cycles, axis=1)
+    profile -= profile.mean(axis=1, keepdims=True)
+    seasonal = np.tile(profile, (1, cycles.shape[1]))[:, :length]
+    return trend, seasonal, matrix - trend - seasonal
+
+
+# Робастная оценка остатков по строкам: отклонение от медианы в единицах MAD
+# (при нулевом MAD — среднего абсолютного отклонения); у постоянных рядов оценка нулевая
+def robust_scores(residual):
+    median = np.median(residual, axis=1, keepdims=True)
+    deviation = np.abs(residual - median)
+    scale = MAD_SCALE * np.median(deviation, axis=1, keepdims=True)
+    fallback = 1.2533 * deviation.mean(axis=1, keepdims=True)
+    scale = np.where(scale > 0, scale, fallback)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scale > 0, (residual - median) / scale, 0.0)
+
+
+# Матрица дневных значений (строка × день) за непрерывный диапазон дат, дни без продаж — нули
+def daily_matrix(daily, row, column, dates):
+    positions = day_number(daily['date']) - day_number(dates[0])
+    rows = pd.Categorical(daily[row].astype(str))
+    matrix = np.zeros((len(rows.categories), len(dates)))
+    np.add.at(matrix, (rows.codes, positions), daily[column].to_numpy(dtype=float))
+    return pd.Index(rows.categories, name=row), matrix
+
+
+# Аномальные дни для общего количества, общей выручки и количества по каждому продукту:
+# все ряды раскладываются одним проходом по двумерной матрице.
+# Таблица: article (None для итогов), measure, date, value, expected (тренд + сезонность), score
+def sales_anomalies(cube, threshold=ANOMALY_THRESHOLD):
+    start_date, end_date = cube.min_date(), cube.max_date()
+    dates = pd.date_range(start_date, end_date, freq='D')
+    totals = cube.by_day(start_date, end_date).reindex(dates, fill_value=0)
+    articles, article_matrix = daily_matrix(cube.article_daily(start_date, end_date), 'article', 'Quantity', dates)
+    matrix = np.vstack([totals['Quantity'].to_numpy(dtype=float), totals['total_price'].to_numpy(dtype=float),
+                        article_matrix])
+    trend, seasonal, residual = decompose(matrix)
+    scores = robust_scores(residual)
+    rows, days = np.nonzero(np.abs(scores) > threshold)
+    labels = np.array([None, None] + list(articles), dtype=object)
+    measures = np.array(['Quantity', 'total_price'] + ['Quantity'] * len(articles), dtype=object)
+    return pd.DataFrame({
+        'article': labels[rows],
+        'measure': measures[rows],
+        'date': dates[days],
+        'value': matrix[rows, days],
+        'expected': (trend + seasonal)[rows, days],
+        'score': scores[rows, days],
+    })
@@ -0,0 +1,119 @@
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pmdarima import auto_arima
+
+from batch_forecast import SEASON, croston, exponential_smoothing, seasonal_naive
+from forecasting import make_model
+
+# Число процессов для обучения моделей на отрезках
+BACKTEST_WORKERS = int(os.environ.get('BAKERY_BACKTEST_WORKERS', os.cpu_count() or 1))
+
+BASELINES = {
+    'naive': seasonal_naive,
+    'ses': exponential_smoothing,
+    'croston': croston,
+}
+
+
+# Кандидаты для сравнения — функции (обучающий ряд, горизонт) -> прогноз. Они передаются
+# в процессы пула, поэтому задаются через functools.partial от функций этого модуля
+
+# Базовая модель из batch_forecast на одном ряду
+def baseline(train, horizon, name='naive', season=SEASON):
+    demand = np.asarray(train, dtype=float)[None, :]
+    if name == 'naive':
+        return seasonal_naive(demand, horizon, season)[0]
+    return BASELINES[name](demand, horizon)[0]
+
+
+# SARIMA с заранее выбранным порядком, переобучаемая на каждом отрезке
+def fixed_sarima(train, horizon, order, seasonal_order, with_intercept=True, maxiter=50):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = make_model(order, seasonal_order, with_intercept, maxiter).fit(np.asarray(train, dtype=float))
+    return model.predict(horizon)
+
+
+# Полный перебор порядка на каждом отрезке, как в nemain.py (auto_arima(stepwise=False))
+def searched_sarima(train, horizon, m=SEASON, D=1, max_p=5, max_q=5, max_P=3, max_Q=3, maxiter=50):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = auto_arima(np.asarray(train, dtype=float), start_p=0, start_q=0, start_P=0, start_Q=0,
+                           max_p=max_p, max_q=max_q, max_P=max_P, max_Q=max_Q, m=m, D=D, seasonal=True,
+                           maxiter=maxiter, information_criterion='aic', stepwise=False,
+                           suppress_warnings=True, error_action='ignore')
+    return model.predict(horizon)
+
+
+# Точки начала прогноза: первая после initial наблюдений, далее через step;
+# каждая оставляет впереди полный горизонт
+def rolling_origins(length, horizon, initial, step=1):
+    return list(range(initial, length - horizon + 1, step))
+
+
+def _forecast_fold(model, train, horizon):
+    started = time.perf_counter()
+    forecast = np.asarray(model(train, horizon), dtype=float)
+    return forecast, time.perf_counter() - started
+
+
+# Ошибки по шагам горизонта для всех моделей сразу: forecasts — (модель × отрезок × шаг),
+# actual — (отрезок × шаг). Неудачные прогнозы (NaN) не учитываются
+def horizon_errors(forecasts, actual):
+    errors = forecasts - actual[None]
+    mse = np.nanmean(errors ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.abs(errors) / np.where(actual != 0, np.abs(actual), np.nan)[None]
+    mape = np.nanmean(relative, axis=1)
+    return mse, np.sqrt(mse), mape
+
+
+# Кросс-валидация со скользящим началом: каждая модель переобучается на каждом
+# отрезке [0, cutoff) в пуле процессов и прогнозирует horizon шагов; все модели
+# сравниваются на одних и тех же отрезках.
+# Возвращает ошибки по шагам горизонта (model, step: mse, rmse, mape) и сводку по моделям
+# (средние ошибки, время обучения на отрезок и общее, число неудачных отрезков)
+def backtest(series, models, horizon, initial, step=1, workers=BACKTEST_WORKERS):
+    values = np.asarray(series, dtype=float).ravel()
+    cutoffs = rolling_origins(len(values), horizon, initial, step)
+    if not cutoffs:
+        raise ValueError('Ряд слишком короткий для выбранных initial и horizon')
+    names = list(models)
+    actual = np.stack([values[cutoff:cutoff + horizon] for cutoff in cutoffs])
+    forecasts = np.full((len(names), len(cutoffs), horizon), np.nan)
+    seconds = np.zeros((len(names), len(cutoffs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_forecast_fold, models[name], values[:cutoff], horizon): (model, fold)
+            for model, name in enumerate(names)
+            for fold, cutoff in enumerate(cutoffs)
+        }
+        for future in as_completed(futures):
+            model, fold = futures[future]
+            try:
+                forecasts[model, fold], seconds[model, fold] = future.result()
+            except Exception:
+                continue
+    mse, rmse, mape = horizon_errors(forecasts, actual)
+    by_horizon = pd.DataFrame({
+        'model': np.repeat(names, horizon),
+        'step': np.tile(np.arange(1, horizon + 1), len(names)),
+        'mse': mse.ravel(),
+        'rmse': rmse.ravel(),
+        'mape': mape.ravel(),
+    })
+    summary = pd.DataFrame({
+        'mse': mse.mean(axis=1),
+        'rmse': rmse.mean(axis=1),
+        'mape': mape.mean(axis=1),
+        'seconds_per_fold': seconds.mean(axis=1),
+        'seconds_total': seconds.sum(axis=1),
+        'failed_folds': np.isnan(forecasts).any(axis=2).sum(axis=1),
+    }, index=pd.Index(names, name='model'))
+    summary.attrs['folds'] = len(cutoffs)
+    return by_horizon, summary.sort_values('rmse')
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Пары, встретившиеся меньше чем в стольких чеках, не показываются: у редких пар лифт неустойчив
+MIN_PAIR_TICKETS = 3
+
+
+# Разреженная матрица вхождений чек × продукт (1 — продукт есть в чеке), строится один раз
+# на набор данных. Строки упорядочены по дате чека, поэтому чеки периода — непрерывный
+# диапазон строк, который находится бинарным поиском. Без столбца Quantity все строки
+# считаются продажами (возвраты отброшены при чтении)
+class BasketMatrix:
+
+    def __init__(self, data):
+        keep = data['article'].notna()
+        if 'Quantity' in data:
+            keep &= data['Quantity'] > 0
+        data = data[keep]
+        order = np.argsort(data['date'].to_numpy(), kind='stable')
+        days = data['date'].to_numpy()[order].astype('datetime64[D]').astype(np.int64)
+        # Номер чека уникален в пределах дня; без номера (пропуск или -1 в хранилище)
+        # чеком считается минута продажи. Ключ «день, признак минуты, номер» неотрицателен
+        # в младших 33 битах, поэтому день чека восстанавливается сдвигом
+        minute = data['minute'].to_numpy()[order].astype(np.int64)
+        if 'ticket_number' in data:
+            ticket = data['ticket_number'].fillna(-1).to_numpy()[order].astype(np.int64)
+        else:
+            ticket = np.full(len(minute), -1, dtype=np.int64)
+        by_minute = ticket < 0
+        keys = (days << 33) + (by_minute.astype(np.int64) << 32) + np.where(by_minute, minute, ticket)
+        ticket_codes, tickets = pd.factorize(keys)
+        articles = data['article']
+        if not isinstance(articles.dtype, pd.CategoricalDtype):
+            articles = articles.astype('category')
+        article_codes = articles.cat.codes.to_numpy()[order]
+        self.articles = articles.cat.categories
+        self.dates = ((tickets >> 33).astype('datetime64[D]')).astype('datetime64[ns]')
+        incidence = sparse.csr_matrix(
+            (np.ones(len(ticket_codes), dtype=np.int32), (ticket_codes, article_codes)),
+            shape=(len(tickets), len(self.articles))
+        )
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        self.incidence = incidence
+
+    def __len__(self):
+        return self.incidence.shape[0]
+
+    # Объём матрицы в памяти, байт
+    def nbytes(self):
+        incidence = self.incidence
+        return incidence.data.nbytes + incidence.indices.nbytes + incidence.indptr.nbytes + self.dates.nbytes
+
+    # Строки чеков за диапазон дат
+    def between(self, start_date, end_date):
+        start = self.dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), side='left')
+        end = self.dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), side='right')
+        return self.incidence[start:end]
+
+    # Пары продуктов за период: число общих чеков, поддержка, достоверность в обе стороны
+    # и лифт. Совместные покупки — произведение X^T X разреженной матрицы периода,
+    # пары берутся из её верхнего треугольника. Период без чеков даёт пустую таблицу
+    # с теми же типами столбцов
+    def pairs(self, start_date, end_date, min_tickets=MIN_PAIR_TICKETS):
+        incidence = self.between(start_date, end_date)
+        tickets = incidence.shape[0]
+        columns = ['article_a', 'article_b', 'tickets', 'support', 'confidence_ab', 'confidence_ba', 'lift']
+        counts = np.asarray(incidence.sum(axis=0)).ravel()
+        together = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+        keep = together.data >= min_tickets
+        a, b, both = together.row[keep], together.col[keep], together.data[keep].astype(float)
+        return pd.DataFrame({
+            'article_a': self.articles[a],
+            'article_b': self.articles[b],
+            'tickets': both.astype(int),
+            'support': both / tickets,
+            'confidence_ab': both / counts[a],
+            'confidence_ba': both / counts[b],
+            'lift': both * tickets / (counts[a] * counts[b]),
+        }, columns=columns)
+
+    # Лучшие пары за период по выбранному показателю
+    def top_pairs(self, start_date, end_date, by='lift', n=10, min_tickets=MIN_PAIR_TICKETS):
+        pairs = self.pairs(start_date, end_date, min_tickets)
+        return pairs.nlargest(n, [by, 'tickets']).reset_index(drop=True)
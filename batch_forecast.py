@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from features import day_number, weekday
+
+# Горизонт прогноза по умолчанию, недель
+FORECAST_WEEKS = 4
+
+# Период сезонности недельного ряда
+SEASON = 52
+
+# Число лидеров продаж, для которых строится SARIMAX, и процессов для их обучения
+SARIMAX_TOP = int(os.environ.get('BAKERY_SARIMAX_TOP', 10))
+FORECAST_WORKERS = int(os.environ.get('BAKERY_FORECAST_WORKERS', os.cpu_count() or 1))
+
+# Сетка коэффициентов сглаживания: для каждого продукта выбирается лучший по ошибке на шаг вперёд
+SMOOTHING_ALPHAS = np.linspace(0.05, 0.95, 19)
+
+# Спрос считается прерывистым, если средний интервал между неделями с продажами больше порога
+INTERMITTENT_ADI = 1.32
+CROSTON_ALPHA = 0.1
+
+MODEL_LABELS = {
+    'naive': 'Сезонный наивный',
+    'ses': 'Экспоненциальное сглаживание',
+    'croston': 'Кростон',
+}
+
+
+# Матрица недельного спроса (продукт × неделя) из продаж продуктов по дням.
+# Недели заканчиваются воскресеньем, как resample('W'); незавершённая последняя
+# неделя отбрасывается, чтобы не занижать последнее наблюдение
+def demand_matrix(daily):
+    days = day_number(daily['date'])
+    week_end = days + 6 - weekday(days)
+    if days.max() < week_end.max():
+        complete = week_end < week_end.max()
+        daily, week_end = daily[complete], week_end[complete]
+    if daily.empty:
+        return pd.Index([], name='article'), pd.DatetimeIndex([]), np.zeros((0, 0))
+    first = week_end.min()
+    weeks = pd.date_range(np.datetime64(int(first), 'D'), periods=(week_end.max() - first) // 7 + 1, freq='W-SUN')
+    positions = (week_end - first) // 7
+    articles = pd.Categorical(daily['article'].astype(str))
+    matrix = np.zeros((len(articles.categories), len(weeks)))
+    np.add.at(matrix, (articles.codes, positions), daily['Quantity'].to_numpy(dtype=float))
+    return pd.Index(articles.categories, name='article'), weeks, matrix
+
+
+# Сезонный наивный прогноз: значение той же недели прошлого сезона (или последнее, если ряд короче сезона)
+def seasonal_naive(demand, horizon, season=SEASON):
+    weeks = demand.shape[1]
+    if weeks < season:
+        return np.repeat(demand[:, -1:], horizon, axis=1)
+    return demand[:, weeks - season + np.arange(horizon) % season]
+
+
+# Простое экспоненциальное сглаживание сразу для всех продуктов и всех коэффициентов сетки
+def exponential_smoothing(demand, horizon, alphas=SMOOTHING_ALPHAS):
+    alphas = np.asarray(alphas)[:, None]
+    level = np.repeat(demand[None, :, 0], len(alphas), axis=0)
+    sse = np.zeros_like(level)
+    for week in range(1, demand.shape[1]):
+        error = demand[:, week] - level
+        sse += error ** 2
+        level += alphas * error
+    best = np.argmin(sse, axis=0)
+    return np.repeat(level[best, np.arange(demand.shape[0])][:, None], horizon, axis=1)
+
+
+# Метод Кростона для прерывистого спроса: отдельно сглаживаются размер продажи
+# и интервал между неделями с продажами, прогноз — их отношение
+def croston(demand, horizon, alpha=CROSTON_ALPHA):
+    rows = demand.shape[0]
+    size = np.full(rows, np.nan)
+    interval = np.full(rows, np.nan)
+    since = np.ones(rows)
+    for week in range(demand.shape[1]):
+        value = demand[:, week]
+        sold = value > 0
+        first = sold & np.isnan(size)
+        later = sold & ~first
+        size = np.where(first, value, np.where(later, size + alpha * (value - size), size))
+        interval = np.where(first, since, np.where(later, interval + alpha * (since - interval), interval))
+        since = np.where(sold, 1, since + 1)
+    forecast = np.where(np.isnan(size), 0, size / np.where(np.isnan(interval), 1, interval))
+    return np.repeat(forecast[:, None], horizon, axis=1)
+
+
+# Средний интервал между неделями с продажами
+def demand_interval(demand):
+    sold = np.count_nonzero(demand > 0, axis=1)
+    return np.where(sold > 0, demand.shape[1] / np.maximum(sold, 1), np.inf)
+
+
+# Базовые прогнозы для всех продуктов: прерывистый спрос — Кростон, остальные —
+# лучший из сезонного наивного и сглаживания по ошибке на последних horizon неделях
+def baseline_forecast(demand, horizon, season=SEASON):
+    models = np.where(demand_interval(demand) > INTERMITTENT_ADI, 'croston', 'ses').astype(object)
+    forecasts = {
+        'naive': seasonal_naive(demand, horizon, season),
+        'ses': exponential_smoothing(demand, horizon),
+        'croston': croston(demand, horizon),
+    }
+    if demand.shape[1] > 2 * horizon:
+        history, holdout = demand[:, :-horizon], demand[:, -horizon:]
+        naive_error = np.abs(seasonal_naive(history, horizon, season) - holdout).mean(axis=1)
+        ses_error = np.abs(exponential_smoothing(history, horizon) - holdout).mean(axis=1)
+        models[(models == 'ses') & (naive_error < ses_error)] = 'naive'
+    result = np.empty_like(forecasts['ses'])
+    for name, forecast in forecasts.items():
+        mask = models == name
+        result[mask] = forecast[mask]
+    return result, models
+
+
+# SARIMAX для одного продукта (выполняется в процессе пула): порядок подбирается
+# пошаговым auto_arima, сезонная часть — если ряд покрывает два сезона.
+# pmdarima нужна только для этого уточнения, поэтому импортируется здесь:
+# панель работает и без неё, оставляя базовые прогнозы
+def fit_sarimax(values, horizon, season=SEASON):
+    from pmdarima import auto_arima
+
+    seasonal = len(values) >= 2 * season
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = auto_arima(values, seasonal=seasonal, m=season if seasonal else 1, D=1 if seasonal else None,
+                           stepwise=True, suppress_warnings=True, error_action='ignore')
+    p, d, q = model.order
+    label = f'SARIMAX({p},{d},{q})'
+    if seasonal:
+        P, D, Q, m = model.seasonal_order
+        label += f'({P},{D},{Q})[{m}]'
+    return np.asarray(model.predict(horizon), dtype=float), label
+
+
+# Прогноз спроса по всем продуктам на horizon недель: базовые модели считаются
+# векторно для всех продуктов сразу, для top лидеров продаж прогноз уточняется
+# SARIMAX в пуле процессов (при ошибке обучения остаётся базовый прогноз).
+# Процессы пула запускаются через spawn: fork многопоточного процесса сервера
+# Streamlit может унаследовать захваченные другими потоками блокировки.
+# Таблица: продукт, модель, прогноз по неделям (дата окончания недели) и итог
+def forecast_articles(daily, horizon=FORECAST_WEEKS, top=SARIMAX_TOP, workers=FORECAST_WORKERS, season=SEASON):
+    articles, weeks, demand = demand_matrix(daily)
+    columns = [(weeks[-1] + pd.Timedelta(weeks=step)).strftime('%d.%m.%Y')
+               for step in range(1, horizon + 1)] if len(weeks) else []
+    if not len(articles):
+        return pd.DataFrame(columns=['article', 'model'] + columns + ['total'])
+    forecasts, models = baseline_forecast(demand, horizon, season)
+    labels = np.array([MODEL_LABELS[model] for model in models], dtype=object)
+    leaders = np.argsort(-demand.sum(axis=1), kind='stable')[:top]
+    if len(leaders) and demand.shape[1] > season // 4:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(fit_sarimax, demand[row], horizon, season): row for row in leaders}
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    forecasts[row], labels[row] = future.result()
+                except Exception:
+                    continue
+    forecasts = np.clip(forecasts, 0, None).round(1)
+    table = pd.DataFrame(forecasts, columns=columns)
+    table.insert(0, 'article', articles)
+    table.insert(1, 'model', labels)
+    table['total'] = forecasts.sum(axis=1).round(1)
+    return table.sort_values('total', ascending=False, kind='stable').reset_index(drop=True)
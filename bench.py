@@ -0,0 +1,262 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from aggregates import SalesCube, build_cube
+from anomalies import sales_anomalies
+from basket import BasketMatrix
+from batch_forecast import SEASON, forecast_articles
+from export import write_report_file
+from forecasting import search_orders
+from ingest import iter_sales_chunks, load_sales, read_sales_csv
+from instrumentation import Profiler, result_rows
+from report import build_report
+from synth import tickets_for_rows, write_sales
+from timeindex import TimeIndex
+
+# Каталог сгенерированных выгрузок и файлов результатов
+BENCH_DIR = os.environ.get('BAKERY_BENCH_DIR', os.path.join('.cache', 'bench'))
+
+# Размеры выгрузок по умолчанию (строк)
+BENCH_SIZES = '100k,1M,10M'
+
+# Выше этого числа строк таблица транзакций в память не загружается:
+# замеряются только потоковая загрузка и разделы по агрегатному кубу
+IN_MEMORY_MAX_ROWS = int(os.environ.get('BAKERY_BENCH_IN_MEMORY_ROWS', 20_000_000))
+
+# Замедление относительно базового файла, которое считается регрессией, и минимальное
+# время этапа, при котором сравнение имеет смысл (короче — шум таймера)
+REGRESSION_RATIO = 1.2
+MIN_COMPARED_SECONDS = 0.005
+
+# Сокращённая сетка перебора SARIMA: полная сетка nemain.py считается часами
+ARIMA_GRID = dict(max_p=2, max_q=2, max_P=1, max_Q=1, max_order=4)
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+
+# «100k», «1M», «50M» или число строк
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(float(text))
+
+
+# Выгрузка примерно на rows строк; сгенерированные файлы переиспользуются
+def dataset_path(rows, data_dir, years=2, articles=150, seed=0):
+    path = os.path.join(data_dir, f'sales_{rows}_{years}y_{articles}a_{seed}.csv')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        write_sales(tmp_path, tickets_per_day=tickets_for_rows(rows, years), years=years, articles=articles,
+                    seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+# Версия кода и окружения, на которых получены результаты
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+# Число строк результата этапа (у куба — число обработанных транзакций)
+def stage_rows(value):
+    if isinstance(value, SalesCube):
+        return value.rows
+    if isinstance(value, (TimeIndex, BasketMatrix)):
+        return len(value)
+    if isinstance(value, int):
+        return value
+    return result_rows(value)
+
+
+# Замеры этапов для одного размера выгрузки: каждый этап выполняется repeat раз,
+# в результаты попадают минимальное и медианное время, строки результата и пиковая память
+class Stages:
+
+    def __init__(self, profiler, size, repeat):
+        self.profiler = profiler
+        self.size = size
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, stage, func, repeat=None):
+        seconds = []
+        for _ in range(repeat or self.repeat):
+            with self.profiler.section(stage) as record:
+                value = func()
+                record['rows'] = stage_rows(value)
+            seconds.append(record['seconds'])
+        self.results.append({
+            'size': self.size,
+            'stage': stage,
+            'rows': record['rows'],
+            'min_seconds': min(seconds),
+            'median_seconds': statistics.median(seconds),
+            'repeat': len(seconds),
+            'peak_bytes': record.get('peak_bytes'),
+        })
+        print(f"{self.size:>10} {stage:<28} {min(seconds):10.4f} с", flush=True)
+        return value
+
+
+# Загрузка: разбор CSV, запись и чтение кэша Parquet, потоковое построение куба
+def bench_ingest(stages, path, in_memory):
+    data = None
+    if in_memory:
+        with open(path, 'rb') as csv_file:
+            stages.run('ingest.read_csv', lambda: read_sales_csv(csv_file))
+            with tempfile.TemporaryDirectory() as cache_dir:
+                stages.run('ingest.parquet_write', lambda: load_sales(csv_file, cache_dir=cache_dir)[1], repeat=1)
+                data = stages.run('ingest.parquet_read', lambda: load_sales(csv_file, cache_dir=cache_dir)[1])
+    with open(path, 'rb') as csv_file:
+        cube = stages.run('ingest.stream_cube', lambda: build_cube(iter_sales_chunks(csv_file)), repeat=1)
+    return data, cube
+
+
+# Фильтрация строк по окну времени, постраничный просмотр и анализ корзины
+def bench_rows(stages, data):
+    index = stages.run('index.build', lambda: TimeIndex(data))
+    stages.run('cube.from_frame', lambda: SalesCube.from_frame(index.data))
+    day = index.data['date'].iloc[len(index) // 2]
+    month_start = day.replace(day=1)
+    month_end = month_start + pd.offsets.MonthEnd(0)
+    leaders = list(index.data['article'].value_counts().index[:3])
+    stages.run('filter.day', lambda: index.select(day, day))
+    stages.run('filter.day_window', lambda: index.select(day, day, 9 * 60, 12 * 60))
+    stages.run('filter.month', lambda: index.select(month_start, month_end))
+    stages.run('filter.count_articles', lambda: index.count(month_start, month_end, articles=leaders))
+    stages.run('filter.page_sorted', lambda: index.page(month_start, month_end, articles=leaders, sort='total_price',
+                                                        descending=True, offset=1000, limit=100))
+    basket = stages.run('basket.build', lambda: BasketMatrix(index.data), repeat=1)
+    stages.run('basket.top_pairs', lambda: basket.top_pairs(month_start, month_end))
+
+
+# Разделы панели и отчёт по агрегатному кубу
+def bench_dashboard(stages, cube):
+    start_date, end_date = cube.min_date(), cube.max_date()
+    leaders = list(cube.top('Quantity', start_date, end_date, n=3)['article'])
+    year = list(cube.years())[-1]
+    stages.run('dashboard.top', lambda: cube.top('total_price', start_date, end_date))
+    stages.run('dashboard.by_day', lambda: cube.by_day(start_date, end_date))
+    stages.run('dashboard.revenue_by_month', lambda: cube.revenue_by_month(year))
+    stages.run('dashboard.by_hour', lambda: cube.by_hour(start_date, end_date))
+    stages.run('dashboard.by_weekday', lambda: cube.by_weekday(start_date, end_date))
+    stages.run('dashboard.product_daily', lambda: cube.product_daily(leaders, start_date, end_date))
+    stages.run('dashboard.price_description', lambda: cube.price_description())
+    stages.run('dashboard.anomalies', lambda: sales_anomalies(cube))
+    with tempfile.TemporaryDirectory() as report_dir:
+        for extension in ('xlsx', 'zip'):
+            path = os.path.join(report_dir, f'report.{extension}')
+            stages.run(f'export.{extension}', lambda: write_report_file(path, build_report(cube), extension))
+
+
+# Прогнозы: базовые модели по всем продуктам и (по флагу) перебор SARIMA недельной выручки
+def bench_forecast(stages, cube, search):
+    daily = cube.article_daily(cube.min_date(), cube.max_date())
+    stages.run('forecast.articles', lambda: forecast_articles(daily, top=0), repeat=1)
+    weekly = cube.by_day(cube.min_date(), cube.max_date())['total_price'].resample('W').sum()
+    if search and len(weekly) >= 2 * SEASON:
+        stages.run('forecast.search_orders',
+                   lambda: search_orders(weekly.to_numpy(), m=SEASON, D=1, **ARIMA_GRID)[1], repeat=1)
+
+
+def run(args):
+    profiler = Profiler(enabled=True, log_path=None)
+    profiler.start_run(True, args.memory)
+    results = []
+    for size in [parse_size(size) for size in args.sizes.split(',')]:
+        path = dataset_path(size, os.path.join(args.out, 'data'), args.years, args.articles, args.seed)
+        stages = Stages(profiler, size, args.repeat)
+        in_memory = size <= args.in_memory_rows
+        data, cube = bench_ingest(stages, path, in_memory)
+        if in_memory:
+            bench_rows(stages, data)
+        del data
+        bench_dashboard(stages, cube)
+        bench_forecast(stages, cube, args.search)
+        results.extend(stages.results)
+    profiler.start_run(False)
+    report = {**environment(), 'repeat': args.repeat, 'memory': args.memory, 'results': results}
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench-{report['created'].replace(':', '')}-{report['commit'] or 'nogit'}.json")
+    with open(path, 'w', encoding='utf-8') as result_file:
+        json.dump(report, result_file, ensure_ascii=False, indent=1)
+    print(f'Результаты: {path}')
+    return 0
+
+
+# Сравнение двух файлов результатов по минимальному времени этапов
+def compare_results(base, new, ratio=REGRESSION_RATIO):
+    columns = ['size', 'stage', 'min_seconds']
+    table = pd.DataFrame(base['results'])[columns].merge(
+        pd.DataFrame(new['results'])[columns], on=['size', 'stage'], suffixes=('_base', '_new'))
+    table['ratio'] = table['min_seconds_new'] / table['min_seconds_base']
+    table['regression'] = (table['ratio'] > ratio) & (table['min_seconds_new'] > MIN_COMPARED_SECONDS)
+    return table
+
+
+def compare(args):
+    with open(args.base, encoding='utf-8') as base_file, open(args.new, encoding='utf-8') as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    table = compare_results(base, new, args.ratio)
+    print(f"{base['commit']} → {new['commit']}")
+    print(table.to_string(index=False, float_format='{:.4f}'.format))
+    regressions = table[table['regression']]
+    if not regressions.empty:
+        print(f'Регрессии (медленнее в {args.ratio} раза и более): {len(regressions)}')
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры загрузки, фильтров, разделов панели, отчёта и прогноза')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='выполнить замеры и сохранить результаты в JSON')
+    run_parser.add_argument('--sizes', default=BENCH_SIZES, help='размеры выгрузок, например «100k,1M,50M»')
+    run_parser.add_argument('--repeat', type=int, default=3, help='повторов быстрых этапов')
+    run_parser.add_argument('--years', type=float, default=2, help='длительность истории выгрузок, лет')
+    run_parser.add_argument('--articles', type=int, default=150, help='число продуктов')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--in-memory-rows', type=int, default=IN_MEMORY_MAX_ROWS,
+                            help='наибольшая выгрузка, загружаемая в память целиком')
+    run_parser.add_argument('--search', action='store_true', help='замерить перебор SARIMA (долго)')
+    run_parser.add_argument('--memory', action='store_true',
+                            help='пиковая память этапов через tracemalloc (замедляет замеры)')
+    run_parser.add_argument('--out', default=BENCH_DIR, help='каталог выгрузок и результатов')
+    compare_parser = commands.add_parser('compare', help='сравнить два файла результатов')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
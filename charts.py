@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Предел точек одной линии, передаваемых в браузер (порядка ширины графика в пикселях)
+CHART_MAX_POINTS = int(os.environ.get('BAKERY_CHART_MAX_POINTS', 1500))
+
+# Линии длиннее порога рисуются через WebGL (Scattergl) вместо SVG
+WEBGL_MIN_POINTS = 1000
+
+# Число столбцов гистограммы
+HISTOGRAM_BINS = 50
+
+# Формат даты в подсказках (вместо списков строк, собранных в Python)
+HOVER_DATE = '%{x|%A (%d.%m.%Y)}'
+
+# Массивы данных трасс, которые составляют основной объём фигуры
+TRACE_ARRAYS = ('x', 'y', 'z', 'labels', 'values', 'text', 'hovertext', 'customdata')
+
+
+# Координаты по оси X как float для вычисления площадей; подписи (например, «ЧЧ:ММ») — по порядку
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    if not np.issubdtype(values.dtype, np.number):
+        return np.arange(len(values), dtype=float)
+    return values.astype(float)
+
+
+# Прореживание Largest-Triangle-Three-Buckets: номера точек, сохраняющих форму линии.
+# Ряд делится на threshold - 2 корзины, из каждой берётся точка с наибольшей площадью
+# треугольника с предыдущей выбранной точкой и средним следующей корзины
+def lttb(x, y, threshold):
+    length = len(y)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    edges = (np.floor(np.arange(threshold - 1) * (length - 2) / (threshold - 2)) + 1).astype(np.int64)
+    edges[-1] = length - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+# Ряд, прореженный до max_points точек
+def downsample(x, y, max_points=CHART_MAX_POINTS):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    points = lttb(x, y, max_points)
+    return x[points], y[points]
+
+
+# Линия графика: длинные ряды прореживаются, большие трассы рисуются через WebGL
+def line_trace(x, y, name, hovertemplate, max_points=CHART_MAX_POINTS, **kwargs):
+    x, y = downsample(x, y, max_points)
+    trace = go.Scattergl if len(x) >= WEBGL_MIN_POINTS else go.Scatter
+    return trace(x=x, y=y, mode='lines', name=name, hovertemplate=hovertemplate, **kwargs)
+
+
+# Гистограмма по значениям и их частотам, посчитанная на сервере: в браузер
+# передаются только столбцы (центр, ширина, высота)
+def histogram_bars(values, counts=None, bins=HISTOGRAM_BINS):
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return go.Bar(x=[], y=[])
+    bins = max(1, min(bins, len(np.unique(values))))
+    heights, edges = np.histogram(values, bins=bins, weights=counts)
+    return go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=heights,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='%{customdata[0]:.2f}–%{customdata[1]:.2f}: %{y}<extra></extra>',
+    )
+
+
+# Число точек фигуры по всем трассам (у круговых диаграмм — число секторов)
+def chart_points(fig):
+    points = 0
+    for trace in fig.data:
+        values = getattr(trace, 'x', None)
+        if values is None:
+            values = getattr(trace, 'labels', None)
+        points += 0 if values is None else len(values)
+    return points
+
+
+# Приблизительный объём фигуры, байт: число элементов массивов данных трасс,
+# умноженное на размер элемента (без сериализации фигуры в JSON)
+def figure_bytes(fig):
+    size = 0
+    for trace in fig.data:
+        for name in TRACE_ARRAYS:
+            values = getattr(trace, name, None)
+            if values is not None and not isinstance(values, str):
+                size += np.asarray(values).nbytes
+    return size
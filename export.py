@@ -0,0 +1,130 @@
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+import xlsxwriter
+
+# Каталог, в котором формируются файлы отчётов
+REPORT_DIR = os.environ.get('BAKERY_REPORT_DIR', os.path.join('.cache', 'reports'))
+
+# Файлы отчётов старше этого срока (секунд) удаляются, а самые старые — ещё и пока
+# каталог не уложится в лимит: файлы завершённых сессий иначе не удалялись бы никогда
+REPORT_MAX_AGE = int(os.environ.get('BAKERY_REPORT_MAX_AGE', 24 * 60 * 60))
+REPORT_MAX_BYTES = int(os.environ.get('BAKERY_REPORT_MAX_BYTES', 1024 ** 3))
+
+# Предел строк на листе Excel; длинные таблицы продолжаются на следующих листах
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_SHEET_NAME = 31
+
+# Форматы отчёта: подпись -> (расширение, MIME-тип)
+REPORT_FORMATS = {
+    'Excel (.xlsx)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV (.zip)': ('zip', 'application/zip'),
+}
+
+
+# Таблица отчёта — DataFrame или итератор блоков DataFrame
+def _chunks(table):
+    if isinstance(table, pd.DataFrame):
+        yield table
+    else:
+        yield from table
+
+
+# Блоки строк таблицы по chunk_size строк (срезы без копирования)
+def iter_row_chunks(data, chunk_size=50_000, convert=None):
+    for start in range(0, len(data), chunk_size):
+        chunk = data.iloc[start:start + chunk_size]
+        yield chunk if convert is None else convert(chunk)
+
+
+def _sheet_name(name, part):
+    suffix = '' if part == 1 else f' ({part})'
+    return name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+
+
+# Отчёт Excel в режиме constant_memory: строки пишутся по порядку и сразу уходят на диск,
+# в памяти держится только текущая строка листа и текущий блок таблицы
+def write_xlsx(path, sheets):
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'dd.mm.yyyy',
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+    })
+    for name, table in sheets.items():
+        worksheet = None
+        part = 0
+        row = 0
+        for chunk in _chunks(table):
+            columns = [str(column) for column in chunk.columns]
+            # Пропуски записываются пустыми ячейками
+            values = chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+            # Пустая таблица даёт лист только с заголовком
+            for record in values or [None]:
+                if worksheet is None or row >= EXCEL_MAX_ROWS:
+                    part += 1
+                    worksheet = workbook.add_worksheet(_sheet_name(name, part))
+                    worksheet.write_row(0, 0, columns)
+                    row = 1
+                if record is not None:
+                    worksheet.write_row(row, 0, record)
+                    row += 1
+    workbook.close()
+
+
+# Отчёт в виде архива CSV: каждая таблица пишется в свой файл блоками
+def write_csv_zip(path, sheets):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, table in sheets.items():
+            with archive.open(f'{name}.csv', 'w', force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8-sig', newline='') as text:
+                    header = True
+                    for chunk in _chunks(table):
+                        chunk.to_csv(text, sep=';', decimal=',', index=False, header=header)
+                        header = False
+
+
+# Удаление устаревших файлов отчётов, затем самых старых, пока каталог не уложится в лимит
+def evict_reports(report_dir=REPORT_DIR, max_age=REPORT_MAX_AGE, max_bytes=REPORT_MAX_BYTES):
+    if not os.path.isdir(report_dir):
+        return
+    files = sorted(
+        ((entry.stat(), entry.path) for entry in os.scandir(report_dir) if entry.name.startswith('report_')),
+        key=lambda item: item[0].st_mtime
+    )
+    total = sum(stat.st_size for stat, _ in files)
+    oldest = time.time() - max_age
+    for stat, path in files:
+        if total <= max_bytes and stat.st_mtime >= oldest:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= stat.st_size
+
+
+# Формирование отчёта во временном файле на диске; возвращает путь к файлу
+def write_report(sheets, extension, report_dir=REPORT_DIR):
+    os.makedirs(report_dir, exist_ok=True)
+    evict_reports(report_dir)
+    handle, path = tempfile.mkstemp(prefix='report_', suffix=f'.{extension}', dir=report_dir)
+    os.close(handle)
+    try:
+        write_report_file(path, sheets, extension)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+# Запись отчёта в заданный файл в выбранном формате
+def write_report_file(path, sheets, extension):
+    if extension == 'xlsx':
+        write_xlsx(path, sheets)
+    else:
+        write_csv_zip(path, sheets)
@@ -0,0 +1,46 @@
+import calendar
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+# Таблицы подписей: индекс массива — значение признака, поэтому подписи для целого
+# столбца получаются одним обращением по индексу вместо форматирования каждой строки.
+# «ЧЧ:ММ» для каждой минуты суток и «ЧЧ:00» для каждого часа
+MINUTE_LABELS = np.array([f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(MINUTES_PER_DAY)])
+HOUR_LABELS = np.array([f'{hour:02d}:00' for hour in range(24)])
+
+# Названия месяцев (с 1, нулевой элемент пустой) и дней недели (с понедельника)
+# в текущей локали, как в модуле calendar
+MONTH_NAMES = np.array(list(calendar.month_name), dtype=object)
+WEEKDAY_NAMES = np.array(list(calendar.day_name), dtype=object)
+
+# Первый день отсчёта номеров дней (1970-01-01) — четверг
+_EPOCH_WEEKDAY = 3
+
+
+# Номер дня (от 1970-01-01) для даты или столбца дат
+def day_number(value):
+    return np.asarray(value, dtype='datetime64[D]').astype(np.int64)
+
+
+# Минута суток для объекта datetime.time
+def minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+# День недели (0 — понедельник) по номерам дней
+def weekday(days):
+    return (np.asarray(days) + _EPOCH_WEEKDAY) % 7
+
+
+# Целочисленные календарные признаки дат: год, месяц (1–12) и день недели (0 — понедельник).
+# Считаются арифметикой над datetime64 без разбора каждой даты в объект Python
+def date_features(dates):
+    days = np.asarray(dates, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]').astype(np.int64)
+    return {
+        'year': (months // 12 + 1970).astype(np.int16),
+        'month': (months % 12 + 1).astype(np.int8),
+        'dow': weekday(days.astype(np.int64)).astype(np.int8),
+    }
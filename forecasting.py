@@ -0,0 +1,176 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from pmdarima.arima import ARIMA, ndiffs
+from pmdarima.utils import diff
+
+# Число процессов для подбора порядка модели
+SEARCH_WORKERS = int(os.environ.get('BAKERY_SEARCH_WORKERS', os.cpu_count() or 1))
+
+# Итерации оптимизатора на отборочном проходе
+SCREEN_MAXITER = int(os.environ.get('BAKERY_SCREEN_MAXITER', 10))
+
+# Эвристическое отсечение: кандидат не дообучается, если его AIC после отбора хуже лучшего
+# найденного больше чем на запас. Отборочный AIC не оценивает окончательный снизу, поэтому
+# с отсечением можно пропустить лучшую модель. По умолчанию (переменная не задана) отсечения
+# нет — полный перебор, как у auto_arima(stepwise=False)
+_prune_margin = os.environ.get('BAKERY_PRUNE_MARGIN')
+PRUNE_MARGIN = float(_prune_margin) if _prune_margin else None
+
+
+# Сетка кандидатов и параметры, которые auto_arima(stepwise=False) выбирает до перебора:
+# порядок разности d (тест KPSS после сезонного дифференцирования), ограничения p и q,
+# наличие свободного члена
+def search_space(y, m, D, max_p=5, max_q=5, max_P=2, max_Q=2, max_order=5, max_d=2):
+    y = np.asarray(y, dtype=float).ravel()
+    max_p = int(min(max_p, np.floor(len(y) / 3)))
+    max_q = int(min(max_q, np.floor(len(y) / 3)))
+    dx = diff(y, differences=D, lag=m) if D > 0 else y
+    d = ndiffs(dx, test='kpss', alpha=0.05, max_d=max_d)
+    if m > 1:
+        if max_P > 0:
+            max_p = min(max_p, m - 1)
+        if max_Q > 0:
+            max_q = min(max_q, m - 1)
+    with_intercept = (d + D) in (0, 1)
+    candidates = [
+        ((p, d, q), (P, D, Q, m))
+        for p in range(max_p + 1)
+        for q in range(max_q + 1)
+        for P in range(max_P + 1)
+        for Q in range(max_Q + 1)
+        if p + q + P + Q <= max_order
+    ]
+    return candidates, with_intercept
+
+
+# Модель с настройками перебора; start_params — начальные параметры для дообучения
+def make_model(order, seasonal_order, with_intercept, maxiter=50, start_params=None):
+    return ARIMA(order=order, seasonal_order=seasonal_order, method='lbfgs', maxiter=maxiter,
+                 suppress_warnings=True, with_intercept=with_intercept, start_params=start_params)
+
+
+# Проверка обратных корней, как в pmdarima: модели у границы обратимости получают AIC = inf
+def _root_test(model, aic):
+    p, _, q = model.order
+    P, _, Q, _ = model.seasonal_order
+    max_invroot = 0
+    if p + P > 0:
+        max_invroot = max(0, *np.abs(1 / model.arroots()))
+    if q + Q > 0 and np.isfinite(aic):
+        max_invroot = max(0, *np.abs(1 / model.maroots()))
+    return np.inf if max_invroot > 1 - 1e-2 else aic
+
+
+# Обучение одного кандидата (выполняется в процессе пула). Как и в auto_arima, любая
+# ошибка обучения исключает только этого кандидата, а не весь перебор
+def fit_candidate(y, order, seasonal_order, with_intercept, maxiter, fit_args):
+    started = time.perf_counter()
+    model = make_model(order, seasonal_order, with_intercept, maxiter)
+    try:
+        model.fit(y, **fit_args)
+    except Exception:
+        return {'aic': np.inf, 'converged': True, 'failed': True,
+                'seconds': time.perf_counter() - started}
+    aic = _root_test(model, model.aic())
+    converged = bool(model.arima_res_.mle_retvals.get('converged', True))
+    return {'aic': aic, 'converged': converged, 'failed': False,
+            'seconds': time.perf_counter() - started}
+
+
+def _label(order, seasonal_order, with_intercept):
+    p, d, q = order
+    P, D, Q, m = seasonal_order
+    return f'ARIMA({p},{d},{q})({P},{D},{Q})[{m}]{" intercept" if with_intercept else ""}'
+
+
+# Полный перебор сезонных ARIMA по AIC в пуле процессов, с тем же выбором, что и
+# у auto_arima(stepwise=False). Сначала все кандидаты обучаются коротко (screen_maxiter
+# итераций); сошедшиеся за это время уже окончательны. Остальные дообучаются полностью,
+# начиная с лучших по отборочному AIC. Если задан prune_margin, кандидаты, чей отборочный
+# AIC хуже лучшего окончательного больше чем на этот запас, снимаются с очереди — это
+# эвристика, и выбранная модель может отличаться от полного перебора.
+# Возвращает обученную лучшую модель и таблицу кандидатов с временем обучения
+def search_orders(y, m, D, max_p=5, max_q=5, max_P=2, max_Q=2, max_order=5, maxiter=50,
+                  workers=SEARCH_WORKERS, screen_maxiter=SCREEN_MAXITER, prune_margin=PRUNE_MARGIN,
+                  trace=False, **fit_args):
+    y = np.asarray(y, dtype=float).ravel()
+    candidates, with_intercept = search_space(y, m, D, max_p, max_q, max_P, max_Q, max_order)
+    screen_maxiter = min(screen_maxiter, maxiter)
+    results = [{'model': _label(order, seasonal_order, with_intercept), 'order': order,
+                'seasonal_order': seasonal_order, 'aic': np.inf, 'screen_aic': np.inf,
+                'seconds': 0.0, 'stage': 'failed'} for order, seasonal_order in candidates]
+
+    def report(result):
+        if trace:
+            print(f"{result['model']}   : AIC={result['aic']:.3f}, Time={result['seconds']:.2f} sec"
+                  f"{'' if result['stage'] == 'full' else ' (' + result['stage'] + ')'}", flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        screening = [pool.submit(fit_candidate, y, order, seasonal_order, with_intercept, screen_maxiter, fit_args)
+                     for order, seasonal_order in candidates]
+        pending = []
+        for index, future in enumerate(screening):
+            fit = future.result()
+            result = results[index]
+            result['screen_aic'] = fit['aic']
+            result['seconds'] = fit['seconds']
+            if fit['failed']:
+                report(result)
+            elif fit['converged'] or screen_maxiter == maxiter:
+                result['aic'] = fit['aic']
+                result['stage'] = 'screen'
+                report(result)
+            else:
+                pending.append(index)
+
+        best = min((result['aic'] for result in results), default=np.inf)
+
+        # Отсечение по запасу относительно лучшего окончательного AIC; кандидаты, отклонённые
+        # на отборе проверкой корней, дообучаются всегда
+        def clearly_worse(index):
+            screen_aic = results[index]['screen_aic']
+            return prune_margin is not None and np.isfinite(screen_aic) and screen_aic > best + prune_margin
+
+        pending.sort(key=lambda index: results[index]['screen_aic'])
+        running = {}
+        for index in pending:
+            if clearly_worse(index):
+                results[index]['stage'] = 'pruned'
+                report(results[index])
+                continue
+            order, seasonal_order = candidates[index]
+            running[pool.submit(fit_candidate, y, order, seasonal_order, with_intercept, maxiter, fit_args)] = index
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                fit = future.result()
+                result = results[index]
+                result['seconds'] += fit['seconds']
+                result['aic'] = fit['aic']
+                result['stage'] = 'failed' if fit['failed'] else 'full'
+                best = min(best, fit['aic'])
+                report(result)
+            # Ещё не начатые обучения, ставшие заведомо худшими, отменяются
+            for future, index in list(running.items()):
+                if clearly_worse(index) and future.cancel():
+                    running.pop(future)
+                    results[index]['stage'] = 'pruned'
+                    report(results[index])
+
+    table = pd.DataFrame(results)
+    finite = table[np.isfinite(table['aic'])]
+    if finite.empty:
+        raise ValueError('Не удалось обучить ни одну модель ARIMA')
+    # При равном AIC выбирается кандидат, идущий раньше в сетке, как при последовательном переборе
+    winner = finite.index[np.argmin(finite['aic'].to_numpy())]
+    order, seasonal_order = candidates[winner]
+    model = make_model(order, seasonal_order, with_intercept, maxiter)
+    model.fit(y, **fit_args)
+    if trace:
+        print(f'\nBest model: {table.at[winner, "model"]}', flush=True)
+    return model, table
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Параметры выгрузки кассы
+CSV_OPTIONS = dict(delimiter=';', encoding='Windows-1251', decimal=',')
+PRICE_COLUMNS = ['unit_price', 'total_price']
+
+# Типы столбцов компактной схемы, не зависящие от значений
+COLUMN_TYPES = {'minute': 'int16', 'dow': 'int8', 'unit_price': 'float32', 'total_price': 'float32'}
+
+# Ключ метаданных Parquet с отчётом об объёме таблицы
+MEMORY_METADATA_KEY = b'bakery.memory'
+
+# Каталог дискового кэша разобранных файлов и его предельный размер
+CACHE_DIR = os.environ.get('BAKERY_CACHE_DIR', os.path.join('.cache', 'sales'))
+CACHE_MAX_BYTES = int(os.environ.get('BAKERY_CACHE_MAX_BYTES', 1024 ** 3))
+
+
+# Хэш содержимого файла (читается блоками, позиция в файле восстанавливается)
+def file_digest(buffer, block_size=1 << 20):
+    digest = hashlib.sha256()
+    buffer.seek(0)
+    for block in iter(lambda: buffer.read(block_size), b''):
+        digest.update(block)
+    buffer.seek(0)
+    return digest.hexdigest()
+
+
+# Преобразование цен в числа (запятая как десятичный разделитель)
+def parse_decimal(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return pd.to_numeric(column.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+
+
+# Объём таблицы в памяти, байт
+def memory_bytes(data):
+    return int(np.sum(data.memory_usage(deep=True)))
+
+
+# Компактная схема таблицы транзакций, применяется один раз при загрузке:
+# дата без времени, минута суток и день недели малыми целыми, продукт категорией,
+# цены float32, целые столбцы (количество, номер чека) минимальной разрядности
+def normalize(data):
+    data['date'] = pd.to_datetime(data['date'], format='%d.%m.%Y')
+    position = data.columns.get_loc('time')
+    time = pd.to_datetime(data.pop('time'), format='%H:%M')
+    data.insert(position, 'minute', (time.dt.hour * 60 + time.dt.minute).astype(COLUMN_TYPES['minute']))
+    data.insert(position + 1, 'dow', data['date'].dt.dayofweek.astype(COLUMN_TYPES['dow']))
+    data['article'] = data['article'].astype('category')
+    for column in PRICE_COLUMNS:
+        if column in data:
+            data[column] = parse_decimal(data[column]).astype(COLUMN_TYPES[column])
+    for column in data.columns.drop(['minute', 'dow']):
+        if pd.api.types.is_integer_dtype(data[column]):
+            data[column] = pd.to_numeric(data[column], downcast='integer')
+    return data
+
+
+# Общие категории для нескольких столбцов: новые значения дописываются в конец,
+# поэтому коды уже существующих категорий не меняются
+def merged_categories(*columns):
+    categories = pd.Index([], dtype=object)
+    for column in columns:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            values = column.cat.categories
+            # Категории первого столбца сохраняют свой порядок (difference бы их отсортировал)
+            if categories.empty:
+                categories = values
+                continue
+        else:
+            values = pd.Index(column.dropna().unique())
+        categories = categories.append(values.difference(categories))
+    return categories
+
+
+# Чтение и разбор CSV без кэша; в attrs сохраняется объём таблицы до и после приведения типов
+def read_sales_csv(buffer):
+    buffer.seek(0)
+    data = pd.read_csv(buffer, **CSV_OPTIONS)
+    raw_bytes = memory_bytes(data)
+    data = normalize(data)
+    data.attrs['memory'] = {'raw_bytes': raw_bytes, 'bytes': memory_bytes(data)}
+    return data
+
+
+# Размер блока при потоковом чтении
+CHUNK_SIZE = int(os.environ.get('BAKERY_CHUNK_SIZE', 200_000))
+
+
+# Потоковое чтение CSV блоками: блок строк и доля прочитанного файла
+def iter_sales_chunks(buffer, chunksize=CHUNK_SIZE):
+    buffer.seek(0, os.SEEK_END)
+    total = buffer.tell()
+    buffer.seek(0)
+    for chunk in pd.read_csv(buffer, chunksize=chunksize, **CSV_OPTIONS):
+        yield normalize(chunk), min(buffer.tell() / total, 1.0) if total else 1.0
+
+
+# Версия схемы в имени файла кэша: при её изменении старые файлы не читаются и вытесняются
+SCHEMA_VERSION = 2
+
+
+def cache_path(digest, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'{digest}.v{SCHEMA_VERSION}.parquet')
+
+
+# Удаление давно не использованных файлов, пока кэш не уложится в лимит
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    if not os.path.isdir(cache_dir):
+        return
+    files = sorted(
+        ((entry.stat(), entry.path) for entry in os.scandir(cache_dir) if entry.name.endswith('.parquet')),
+        key=lambda item: item[0].st_mtime
+    )
+    total = sum(stat.st_size for stat, _ in files)
+    for stat, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= stat.st_size
+
+
+# Загрузка файла: повторные загрузки того же содержимого читаются из Parquet
+def load_sales(buffer, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, digest=None):
+    if digest is None:
+        digest = file_digest(buffer)
+    path = cache_path(digest, cache_dir)
+    if os.path.exists(path):
+        try:
+            table = pq.read_table(path)
+            data = table.to_pandas()
+            data.attrs['memory'] = json.loads((table.schema.metadata or {}).get(MEMORY_METADATA_KEY, b'{}'))
+            # Обновление времени доступа для политики вытеснения
+            os.utime(path)
+            return digest, data
+        except (OSError, ValueError):
+            pass
+    data = read_sales_csv(buffer)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[MEMORY_METADATA_KEY] = json.dumps(data.attrs['memory']).encode()
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, path)
+        evict(cache_dir, max_bytes)
+    except (OSError, ValueError, TypeError):
+        # Кэш необязателен: при ошибке записи работаем с разобранными данными
+        pass
+    return digest, data
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Замеры по умолчанию выключены: включаются переменной окружения или флажком на панели
+PROFILE_ENABLED = os.environ.get('BAKERY_PROFILE', '0') == '1'
+
+# Журнал замеров: по строке JSON на раздел
+PROFILE_LOG = os.environ.get('BAKERY_PROFILE_LOG', os.path.join('.cache', 'profile.jsonl'))
+
+# Размер журнала, после которого он переименовывается в «.1» (предыдущая копия
+# удаляется) и начинается заново: на диске не больше двух таких файлов
+PROFILE_LOG_BYTES = int(os.environ.get('BAKERY_PROFILE_LOG_BYTES', 10 * 1024 ** 2))
+
+_log_lock = threading.Lock()
+
+# tracemalloc общий для процесса: он работает, пока память учитывает хотя бы одна сессия
+_memory_lock = threading.Lock()
+_memory_sessions = 0
+
+
+def _acquire_memory():
+    global _memory_sessions
+    with _memory_lock:
+        _memory_sessions += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def _release_memory():
+    global _memory_sessions
+    with _memory_lock:
+        _memory_sessions -= 1
+        if _memory_sessions == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+# Число строк результата раздела, если оно известно без вычислений
+def result_rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray)):
+        return len(value)
+    if isinstance(value, tuple):
+        rows = [result_rows(item) for item in value]
+        rows = [count for count in rows if count is not None]
+        return sum(rows) if rows else None
+    return None
+
+
+# Замеры разделов одной сессии: время, число строк результата и пиковая память
+# (tracemalloc) для каждого раздела перезапуска страницы. Записи дописываются
+# в журнал JSONL и хранятся до следующего перезапуска для панели на боковой панели.
+# Выключенный замер — пустой контекстный менеджер без вызовов таймеров и tracemalloc
+class Profiler:
+
+    def __init__(self, enabled=PROFILE_ENABLED, log_path=PROFILE_LOG):
+        self.enabled = enabled
+        self.memory = False
+        self.log_path = log_path
+        self.run = 0
+        self.records = []
+        self._stack = []
+        self._memory_release = None
+
+    # Начало перезапуска страницы: замеры прошлого перезапуска сбрасываются.
+    # Сессия, учитывающая память, держит ссылку на tracemalloc, пока не выключит учёт
+    # или не будет удалена; tracemalloc останавливается, когда ссылок не остаётся.
+    # Пока он работает, выделения памяти замедляются во всех сессиях процесса,
+    # а пиковая память включает и выделения других сессий
+    def start_run(self, enabled, memory=False):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        if self.memory and self._memory_release is None:
+            _acquire_memory()
+            self._memory_release = weakref.finalize(self, _release_memory)
+        elif not self.memory and self._memory_release is not None:
+            self._memory_release()
+            self._memory_release = None
+        self.run += 1
+        self.records = []
+        self._stack = []
+
+    # Замер раздела; в выданный словарь раздел может добавить свои поля (например, rows).
+    # Вложенные разделы учитываются и в пиковой памяти внешних
+    @contextmanager
+    def section(self, name, **fields):
+        record = {'section': name, **fields}
+        if not self.enabled:
+            yield record
+            return
+        frame = {'current': 0, 'peak': 0}
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            frame['current'], peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as error:
+            record['error'] = type(error).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self._stack.pop()
+            if memory and tracemalloc.is_tracing():
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                record['peak_bytes'] = peak - frame['current']
+            record.update(time=time.time(), run=self.run, depth=len(self._stack), seconds=seconds)
+            self.records.append(record)
+            self._write(record)
+
+    def _write(self, record):
+        if not self.log_path:
+            return
+        directory = os.path.dirname(self.log_path)
+        with _log_lock:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) >= PROFILE_LOG_BYTES:
+                os.replace(self.log_path, f'{self.log_path}.1')
+            with open(self.log_path, 'a', encoding='utf-8') as log:
+                log.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    # Замеры текущего перезапуска в порядке начала разделов (внешние раньше вложенных)
+    def table(self):
+        columns = ['section', 'depth', 'seconds', 'rows', 'cached', 'peak_bytes']
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        table = pd.DataFrame(self.records).reindex(columns=columns + ['time'])
+        table['started'] = table['time'] - table['seconds']
+        return table.sort_values(['started', 'depth'], kind='stable')[columns].reset_index(drop=True)
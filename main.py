@@ -1,13 +1,28 @@
 import pandas as pd
 import streamlit as st
 import datetime
+import copy
+import os
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import calendar
-import time
 import io
 import plotly.io as pio
 
+from aggregates import MEASURES, SalesCube, build_cube
+from anomalies import sales_anomalies
+from basket import BasketMatrix
+from charts import HOVER_DATE, chart_points, histogram_bars, line_trace
+from batch_forecast import SARIMAX_TOP, forecast_articles
+from instrumentation import PROFILE_ENABLED, Profiler, result_rows
+from ingest import file_digest, iter_sales_chunks, load_sales, read_sales_csv
+from features import HOUR_LABELS, MINUTE_LABELS, WEEKDAY_NAMES, minute_of_day
+from timeindex import TimeIndex
+from export import REPORT_FORMATS, write_report
+from report import DESCRIPTION_LABELS, build_report
+from result_cache import ResultCache
+from shared import SharedDatasets
+from warehouse import Warehouse
+
 pio.templates.default = "plotly_white"
 pio.renderers.default = "notebook"
 pio.renderers.default = "colab"
@@ -58,498 +73,660 @@ def convert_df(df):
     output.seek(0)
     return output.getvalue()
 
-def run_app():
-
-    data = None
-    container = st.empty()  # Создание пустого контейнера для отображения содержимого
-
-    uploaded_file = st.file_uploader('Загрузите файл CSV', type='csv', key='file_uploader')
-    with container:
-        if uploaded_file is not None:
-            try:
-                data = pd.read_csv(uploaded_file, delimiter=';', encoding='Windows-1251')
-                st.success('Данные успешно загружены!')
-                time.sleep(3)  # Ожидание 3 секунд
-                container.empty()  # Скрытие сообщения
-            except:
-                st.error('Неверный файл')
-
-    if data is not None:
-        # Преобразование столбца 'date' в тип datetime
-        data['date'] = pd.to_datetime(data['date'], format='%d.%m.%Y')
-        # Определение минимальной и максимальной даты
-        min_date = data['date'].min().date()
-        max_date = data['date'].max().date()
-        # Боковая панель с фильтрами
-        st.sidebar.subheader('Фильтры')
-        # Фильтр диапазона дат
-        start_date = st.sidebar.date_input('Выберите начальную дату', value=min_date, min_value=min_date, max_value=max_date)
-        end_date = st.sidebar.date_input('Выберите конечную дату', value=max_date, min_value=min_date, max_value=max_date)
-        # Преобразование столбца 'time' в тип datetime
-        data['time'] = pd.to_datetime(data['time'], format='%H:%M')
-        # Проверка, совпадают ли начальная и конечная даты
-        same_date = start_date == end_date
-        if same_date:
-            # Фильтр диапазона времени только при совпадающих датах
-            start_time = st.sidebar.time_input('Выберите начальное время', value=datetime.time(0, 0))
-            end_time = st.sidebar.time_input('Выберите конечное время', value=datetime.time(23, 59))
-            # Преобразование времени в формат строки
-            start_time_str = start_time.strftime('%H:%M')
-            end_time_str = end_time.strftime('%H:%M')
-            # Фильтрация данных по дате и времени
-            filtered_data = data[(data['date'] == pd.to_datetime(start_date)) &
-                                 (data['time'].dt.strftime('%H:%M') >= start_time_str) &
-                                 (data['time'].dt.strftime('%H:%M') <= end_time_str)]
-        else:
-            # Фильтрация данных только по дате
-            filtered_data = data[(data['date'] >= pd.to_datetime(start_date)) & (data['date'] <= pd.to_datetime(end_date))]
-
-        # Удаление времени из столбца 'date'
-        filtered_data['date'] = filtered_data['date'].dt.date
+# Выгрузка таблицы в Excel с замером времени преобразования
+def excel_bytes(table):
+    with profiler().section('convert_df', rows=len(table)):
+        return convert_df(table)
+
+# Замеры разделов текущей сессии (при выключенных замерах почти ничего не стоят)
+def profiler():
+    return st.session_state.setdefault('profiler', Profiler())
+
+# Вывод графика с замером сериализации фигуры; число точек считается только при включённых замерах
+def show_chart(fig, **kwargs):
+    with profiler().section('plotly_chart') as record:
+        if profiler().enabled:
+            record['rows'] = chart_points(fig)
+        st.plotly_chart(fig, **kwargs)
+
+# Панель замеров последнего перезапуска страницы
+def show_profile():
+    profile = profiler()
+    if not profile.enabled:
+        return
+    table = profile.table()
+    with st.sidebar.expander('Замеры производительности', expanded=True):
+        total = table.loc[table['depth'] == 0, 'seconds'].sum()
+        st.caption(f'Перезапуск {profile.run}: {total:.2f} с; журнал — {profile.log_path}')
+        table['section'] = ['· ' * depth + section for depth, section in zip(table['depth'], table['section'])]
+        table['ms'] = (table['seconds'] * 1000).round(1)
+        table['peak_mb'] = (table['peak_bytes'] / 2 ** 20).round(2)
+        st.dataframe(table[['section', 'ms', 'rows', 'cached', 'peak_mb']], use_container_width=True)
+
+# Раздел панели, который перестраивается отдельно от остальной страницы: изменение
+# его виджетов перезапускает только функцию раздела (st.fragment, Streamlit 1.37+)
+fragment = st.fragment
+
+# Общий для всех сессий кэш результатов разделов (таблицы и фигуры) с бюджетом памяти
+@st.cache_resource(show_spinner=False)
+def result_cache():
+    return ResultCache()
+
+# Результат раздела из общего кэша по отпечатку набора данных сессии и параметрам
+# фильтров, от которых раздел зависит: при возврате к недавнему виду расчёт не повторяется
+def cached_result(section, params, compute):
+    name = section if isinstance(section, str) else ':'.join(map(str, section))
+    with profiler().section(name) as record:
+        def measured():
+            record['cached'] = False
+            return compute()
+        value = result_cache().get((section, st.session_state.get('dataset'), params), measured)
+        record.setdefault('cached', True)
+        record['rows'] = result_rows(value)
+    return value
+
+# Хэш содержимого загруженного файла считается один раз на загрузку, а не при каждом
+# перезапуске страницы
+def upload_digest(uploaded_file):
+    upload_id = getattr(uploaded_file, 'file_id', None) or getattr(uploaded_file, 'id', None)
+    if upload_id is None:
+        with profiler().section('file_digest'):
+            return file_digest(uploaded_file)
+    with profiler().section('file_digest'):
+        return result_cache().get(('digest', upload_id), lambda: file_digest(uploaded_file))
+
+# Общий для всех сессий процесса кэш наборов данных с бюджетом памяти
+@st.cache_resource(show_spinner=False)
+def shared_datasets():
+    return SharedDatasets()
+
+# Потоковая загрузка: файл читается блоками и сворачивается в агрегатный куб
+def load_aggregates(digest, uploaded_file):
+    def load():
+        progress = st.progress(0.0)
+        with profiler().section('build_cube') as record:
+            cube = build_cube(iter_sales_chunks(uploaded_file), progress.progress)
+            record['rows'] = cube.rows
+        progress.empty()
+        return cube
+    return shared_datasets().get(('cube', digest), load, lambda cube: cube.nbytes())
+
+# Таблица топ-10 с выгрузкой в Excel и круговой диаграммой; params — фильтры,
+# по которым построена таблица (ключ кэша диаграммы)
+def show_top(table, column, title, file_name, params):
+    st.write(title)
+    st.dataframe(table, use_container_width=True)
+    st.download_button(
+        label="Скачать в фомате .xlsx",
+        data=excel_bytes(table),
+        file_name=file_name,
+        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    st.markdown('---')
+    def build():
+        chart_data = table.set_index('article')[column]
+        fig = go.Figure(data=[go.Pie(labels=chart_data.index, values=chart_data)])
+        fig.update_layout(title=title)
+        return fig
+    show_chart(cached_result(('top_figure', column), params, build), use_container_width=True)
+    st.markdown('---')
+
+# Выручка по месяцам выбранного года в виде гистограммы или круговой диаграммы
+def show_revenue_by_month(revenue_by_month, selected_year, chart_type):
+    show_chart(cached_result('revenue_figure', (selected_year, chart_type),
+                                  lambda: revenue_figure(revenue_by_month, selected_year, chart_type)),
+                    use_container_width=True)
+
+def revenue_figure(revenue_by_month, selected_year, chart_type):
+    if chart_type == 'Гистограмма':
+        fig = go.Figure(data=[go.Bar(x=revenue_by_month['date'], y=revenue_by_month['total_price'])])
+        fig.update_layout(
+            title=f'Выручка по месяцам ({selected_year})',
+            xaxis_title='Месяц',
+            yaxis_title='Выручка'
+        )
+    else:
+        fig = go.Figure(data=[go.Pie(labels=revenue_by_month['date'], values=revenue_by_month['total_price'])])
+        fig.update_layout(
+            title=f'Круговая диаграмма выручки по месяцам ({selected_year})'
+        )
+    return fig
 
-        # Удаление даты из столбца 'time'
-        filtered_data['time'] = filtered_data['time'].dt.time
+# Линейный график динамики продаж; hover_title — заголовок подсказки в формате
+# hovertemplate (например, HOVER_DATE), длинные ряды прореживаются.
+# Фигура кэшируется по заголовку и фильтрам params, по которым построен ряд
+def show_dynamics(x, y, hover_title, title, xaxis_title, yaxis_title, name, params, hover_label='Продажи',
+                  y_format='', anomalies=None):
+    def build():
+        fig = go.Figure()
+        fig.add_trace(line_trace(x, y, name, f'<b>{hover_title}</b><br>{hover_label}: %{{y{y_format}}}'))
+        if anomalies is not None:
+            add_anomaly_markers(fig, anomalies, hover_label, y_format)
+        fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title)
+        return fig
+    show_chart(cached_result(('dynamics_figure', title), params, build), use_container_width=True)
+
+# Аномальные дни — маркеры поверх линии; в подсказке ожидаемое значение (тренд + сезонность)
+def add_anomaly_markers(fig, anomalies, hover_label='Продажи', y_format='', name='Аномалии'):
+    if anomalies.empty:
+        return
+    fig.add_trace(go.Scatter(
+        x=anomalies['date'],
+        y=anomalies['value'],
+        mode='markers',
+        name=name,
+        marker=dict(color='crimson', size=9, symbol='circle-open', line=dict(width=2)),
+        customdata=anomalies['expected'],
+        hovertemplate=f'<b>Аномалия %{{x|%d.%m.%Y}}</b><br>{hover_label}: %{{y{y_format}}}'
+                      f'<br>Ожидалось: %{{customdata:.1f}}<extra></extra>'
+    ))
+
+# Аномальные дни по всей истории набора: считаются один раз на набор данных в сессии
+def dataset_anomalies(cube):
+    return cached_result('anomalies', (), lambda: sales_anomalies(cube))
+
+# Аномалии ряда в пределах периода графика
+def anomalies_between(anomalies, start_date, end_date, measure='Quantity', article=None):
+    rows = anomalies['measure'] == measure
+    rows &= anomalies['article'].isna() if article is None else anomalies['article'] == article
+    rows &= anomalies['date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+    return anomalies[rows]
+
+# Описательная статистика и гистограмма цен
+def show_price_analysis(description, prices, counts):
+    st.subheader('Анализ распределения цен')
+    col10, col20 = st.columns(2)
+    with col10:
+        st.write(description.rename(index=DESCRIPTION_LABELS))
+    with col20:
+        with st.expander("Пояснение"):
+            st.write('count - общее количество значени;')
+            st.write('mean - среднее значение цены;')
+            st.write('std - стандартное отклонение, которое измеряет разброс значений относительно их среднего значения и указывает на степень вариации цен;')
+            st.write('min - минимальное значение;')
+            st.write('25% - 25-й перцентиль - значение, ниже которого находится 25% значений столбца;')
+            st.write('50% - Медиана - Это показатель, который указывает на цену, ниже которой находится 50% продуктов.;')
+            st.write('75% - 75-й перцентиль - значение, ниже которого находится 75% значений столбц;')
+            st.write('max - максимальное значение.')
+    # Столбцы считаются на сервере по частотам цен
+    def build():
+        fig = go.Figure(data=[histogram_bars(prices, counts)])
+        fig.update_layout(
+            title='Распределение цен',
+            xaxis_title='Цена',
+            yaxis_title='Частота'
+        )
+        return to_russian(fig)
+    show_chart(cached_result('price_figure', (), build))
+
+# Сводные таблицы по часу дня и дню недели
+def show_pivots(sales_by_hour, sales_by_day_of_week):
+    col11, col21 = st.columns(2)
+    with col11:
+        st.subheader('Продажи по часу дня')
+        st.write(sales_by_hour.rename(columns={'hour': 'Час', 'total_price': 'Сумма продаж'}))
+    with col21:
+        st.subheader('Продажи по дню недели')
+        st.write(sales_by_day_of_week.rename(columns={'day_of_week': 'День недели', 'total_price': 'Сумма продаж'}))
+
+# Полный отчёт: листы собираются (make_sheets) и файл формируется на диске только
+# по кнопке, затем отдаётся кнопкой скачивания. Streamlit читает данные кнопки
+# в память сервера и держит их, пока кнопка показана, поэтому кнопка выводится
+# только в перезапуске, сформировавшем отчёт: следующий перезапуск раздела
+# освобождает эту память. После чтения файл на диске больше не нужен и удаляется
+@fragment
+def show_report_export(make_sheets):
+    st.subheader('Полный отчёт')
+    report_format = st.radio('Формат отчёта', list(REPORT_FORMATS), horizontal=True, key='report_format')
+    extension, mime = REPORT_FORMATS[report_format]
+    if not st.button('Сформировать отчёт', key='build_report'):
+        return
+    with st.spinner('Формирование отчёта...'):
+        with profiler().section('write_report', format=extension):
+            path = write_report(make_sheets(), extension)
+    try:
+        with open(path, 'rb') as report_file:
+            st.download_button(
+                label='Скачать полный отчёт',
+                data=report_file,
+                file_name=f'report.{extension}',
+                mime=mime,
+            )
+    finally:
+        os.remove(path)
+
+# Отображение строк: дата без времени и время «ЧЧ:ММ» вместо служебных столбцов
+def display_rows(frame):
+    times = MINUTE_LABELS[frame['minute'].to_numpy()]
+    frame = frame.drop(columns=['minute', 'dow'])
+    frame['date'] = frame['date'].dt.date
+    frame.insert(frame.columns.get_loc('date') + 1, 'time', times)
+    return frame
+
+# Подписи столбцов, по которым можно сортировать строки
+ROW_SORT_LABELS = {
+    None: 'Время',
+    'ticket_number': 'Номер чека',
+    'article': 'Продукт',
+    'Quantity': 'Количество',
+    'unit_price': 'Цена',
+    'total_price': 'Сумма',
+}
 
-        with st.container():
-            st.markdown('---')
-            st.title('Анализ данных')
-            st.markdown('---')
+# Постраничный просмотр строк окна: отбор по продуктам, сортировка и подсчёт строк
+# выполняются на сервере (индекс по времени или запросы к хранилищу), в браузер
+# передаётся только текущая страница
+@fragment
+def show_rows_page(index, window, products):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        articles = st.multiselect('Продукты', products, key='rows_articles')
+    with col2:
+        sort = st.selectbox('Сортировать по', list(ROW_SORT_LABELS), format_func=ROW_SORT_LABELS.get, key='rows_sort')
+        descending = st.checkbox('По убыванию', key='rows_descending')
+    with col3:
+        page_size = st.selectbox('Строк на странице', [50, 100, 500, 1000], index=1, key='rows_page_size')
+    total = cached_result('rows_count', (window, articles), lambda: index.count(*window, articles=articles))
+    pages = max(1, -(-total // page_size))
+    # При смене фильтров просмотр возвращается на первую страницу
+    signature = (window, tuple(articles), sort, descending, page_size)
+    if st.session_state.get('rows_signature') != signature:
+        st.session_state['rows_signature'] = signature
+        st.session_state['rows_page'] = 1
+    page = st.number_input(f'Страница (из {pages})', min_value=1, max_value=pages, step=1, key='rows_page')
+    page = min(int(page), pages)
+    offset = (page - 1) * page_size
+    rows = cached_result('rows_page', (window, articles, sort, descending, offset, page_size), lambda: display_rows(
+        index.page(*window, articles=articles, sort=sort, descending=descending, offset=offset, limit=page_size)))
+    st.dataframe(rows, use_container_width=True)
+    st.caption(f'Строки {min(offset + 1, total)}–{offset + len(rows)} из {total}')
+
+# Индекс по времени и куб строятся один раз на набор данных и общие для всех сессий
+def dataset_for(digest, uploaded_file):
+    def load():
+        # Разбор файла выполняется один раз, повторные загрузки читают кэш
+        with profiler().section('load_sales') as record:
+            _, data = load_sales(uploaded_file, digest=digest)
+            record['rows'] = len(data)
+        with profiler().section('time_index', rows=len(data)):
+            index = TimeIndex(data)
+        with profiler().section('build_cube', rows=len(data)):
+            return index, SalesCube.from_frame(index.data)
+    return shared_datasets().get(('rows', digest), load, lambda dataset: dataset[0].nbytes() + dataset[1].nbytes())
+
+# Дозагрузка партий: набор данных сессии обновляется только строками новых партий,
+# общий для сессий кэшированный набор при этом не изменяется. Копия индекса сессии
+# делит с ним строки: партии добавляются в неё отдельными сегментами
+def apply_deltas(digest, index, cube, delta_files):
+    delta_digests = [upload_digest(delta_file) for delta_file in delta_files]
+    state = st.session_state.get('appended')
+    # Если исходный файл или режим загрузки сменился или партию убрали из списка,
+    # набор собирается заново
+    if (state is None or state['digest'] != digest or (state['index'] is None) != (index is None)
+            or delta_digests[:len(state['deltas'])] != state['deltas']):
+        state = {'digest': digest, 'index': copy.copy(index), 'cube': cube.copy(), 'deltas': []}
+    for delta_digest, delta_file in list(zip(delta_digests, delta_files))[len(state['deltas']):]:
+        with profiler().section('read_delta') as record:
+            rows = read_sales_csv(delta_file)
+            record['rows'] = len(rows)
+        if state['index'] is not None:
+            state['index'].append(rows)
+        state['cube'].update(rows)
+        state['deltas'].append(delta_digest)
+    st.session_state['appended'] = state
+    return state['index'], state['cube']
+
+# Хранилище истории общее для всех сессий
+@st.cache_resource(show_spinner=False)
+def get_warehouse():
+    return Warehouse()
+
+# Добавление файла в хранилище (один раз на содержимое) с отображением прогресса
+def store_upload(warehouse, uploaded_file):
+    digest = upload_digest(uploaded_file)
+    if warehouse.has_upload(digest):
+        return
+    progress = st.progress(0.0)
+    with profiler().section('store_upload') as record:
+        added = warehouse.add_chunks(digest, iter_sales_chunks(uploaded_file), progress.progress)
+        record['rows'] = added
+    progress.empty()
+    st.sidebar.caption(f'Добавлено новых транзакций: {added}')
+
+# Прогноз спроса по продуктам на ближайшие недели по всей истории продаж;
+# строится по кнопке и хранится в сессии до смены набора данных или параметров
+@fragment
+def show_article_forecast(cube):
+    st.subheader('Прогноз спроса по продуктам')
+    col1, col2 = st.columns(2)
+    with col1:
+        horizon = st.selectbox('Горизонт прогноза, недель', [1, 2, 4, 8], index=2)
+    with col2:
+        refine = st.checkbox(f'Уточнить SARIMAX для {SARIMAX_TOP} лидеров продаж', value=False)
+    key = (st.session_state.get('dataset'), horizon, refine)
+    if st.button('Построить прогноз', key='article_forecast_button'):
+        daily = cube.article_daily(cube.min_date(), cube.max_date())
+        with st.spinner('Расчёт прогноза...'), profiler().section('forecast_articles', rows=len(daily)):
+            st.session_state['article_forecast'] = (key, forecast_articles(daily, horizon, SARIMAX_TOP if refine else 0))
+    forecast = st.session_state.get('article_forecast')
+    if forecast is not None and forecast[0] == key:
+        st.dataframe(forecast[1], use_container_width=True)
+        st.download_button(
+            label="Скачать в фомате .xlsx",
+            data=excel_bytes(forecast[1]),
+            file_name='article_forecast.xlsx',
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    st.markdown('---')
+
+# Матрица чек × продукт: по строкам индекса строится один раз на набор данных,
+# в хранилище — только по чекам периода фильтра (в pandas читаются три столбца)
+def dataset_basket(index, start_date, end_date):
+    if isinstance(index, TimeIndex):
+        return cached_result('basket', (), lambda: BasketMatrix(index.data))
+    return cached_result('basket', (start_date, end_date),
+                         lambda: BasketMatrix(index.basket_rows(start_date, end_date)))
+
+# Пары продуктов, которые чаще всего покупают вместе, за период фильтра
+@fragment
+def show_basket(index, start_date, end_date):
+    st.subheader('Совместные покупки')
+    if index is None:
+        st.caption('В потоковом режиме чеки не хранятся, анализ корзины недоступен.')
+        st.markdown('---')
+        return
+    labels = {'lift': 'Лифт', 'tickets': 'Число чеков', 'confidence_ab': 'Достоверность'}
+    by = st.selectbox('Сортировать пары по', list(labels), format_func=labels.get, key='basket_sort')
+    pairs = cached_result('basket_pairs', (start_date, end_date, by), lambda: dataset_basket(
+        index, start_date, end_date).top_pairs(start_date, end_date, by=by))
+    if pairs.empty:
+        st.write('Нет повторяющихся пар продуктов за выбранный период.')
+    else:
+        st.dataframe(pairs, use_container_width=True)
+    st.markdown('---')
+
+# Строки окна одного дня и куб по ним: пересчитываются только при смене окна
+def window_view(index, window):
+    def build():
+        rows = index.select(*window)
+        # Фильтр по минутам точнее часового куба: срез строится по строкам одного дня
+        return rows, SalesCube.from_frame(rows)
+    return cached_result('window', window, build)
+
+# Выручка по месяцам: выбор года и типа графика перестраивает только этот раздел
+@fragment
+def show_revenue_section(cube):
+    colgr1, colgr2 = st.columns(2)
+    with colgr1:
+        # Выбор года с помощью виджета
+        selected_year11 = st.selectbox('Выберите год', cached_result('years', (), cube.years))
+    with colgr2:
+        # Выбор типа графика с помощью селектбокса
+        chart_type = st.selectbox('Выберите тип графика', ['Гистограмма', 'Круговая диаграмма'])
+    with st.container():
+        revenue_by_month11 = cached_result('revenue_by_month', selected_year11,
+                                           lambda: cube.revenue_by_month(selected_year11))
+        show_revenue_by_month(revenue_by_month11, selected_year11, chart_type)
+
+# Динамика продаж выбранных продуктов: период и продукты раздела не перезапускают страницу
+@fragment
+def show_product_dynamics(cube, min_date, max_date):
+    col3, col4 = st.columns(2)
+    with col3:
+        # Фильтр даты
+        start_date_chart = st.date_input('Выберите начальную дату', min_value=min_date, max_value=max_date, key='start_date', value=min_date)
+    with col4:
+        end_date_chart = st.date_input('Выберите конечную дату', min_value=min_date, max_value=max_date, key='end_date', value=max_date)
+    # Фильтр продуктов
+    products = cached_result('chart_products', (start_date_chart, end_date_chart),
+                             lambda: cube.by_article(start_date_chart, end_date_chart).index)
+    selected_products_chart = st.multiselect('Выберите продукты', products)
+    if not selected_products_chart:
+        return
+    # Продажи выбранных продуктов по дням
+    sales_by_product_date = cached_result(
+        'product_daily', (start_date_chart, end_date_chart, set(selected_products_chart)),
+        lambda: cube.product_daily(selected_products_chart, start_date_chart, end_date_chart)
+    )
+    if sales_by_product_date.empty:
+        return
+    # Создание графика динамики продаж по каждому продукту
+    def build():
+        fig_sales_by_product = go.Figure()
+        for product in selected_products_chart:
+            data_product = sales_by_product_date[sales_by_product_date['article'] == product]
+            fig_sales_by_product.add_trace(line_trace(
+                data_product['date'], data_product['Quantity'], product,
+                f'<b>{HOVER_DATE}: %{{y}}</b><br>Продажи: %{{y}}'
+            ))
+            add_anomaly_markers(fig_sales_by_product,
+                                anomalies_between(dataset_anomalies(cube), start_date_chart,
+                                                  end_date_chart, article=product),
+                                name=f'Аномалии: {product}')
+        fig_sales_by_product.update_layout(
+            title='Динамика продаж по продуктам',
+            xaxis_title='Дата',
+            yaxis_title='Количество продаж',
+            legend=dict(orientation='h', yanchor='top', xanchor='left', x=0, y=1.2),
+            height=400, width=600
+        )
+        return fig_sales_by_product
+    fig_sales_by_product = cached_result('product_figure', (start_date_chart, end_date_chart, selected_products_chart),
+                                         build)
+    show_chart(fig_sales_by_product, use_container_width=True)
+
+# Панель анализа: все разделы строятся срезами агрегатного куба (или запросами
+# к хранилищу с тем же интерфейсом). Строки (индекс по времени или хранилище)
+# нужны только для их просмотра и поминутной детализации одного дня,
+# в потоковом режиме (index is None) они не хранятся.
+# Разделы со своими виджетами перестраиваются отдельно (fragment), результаты
+# разделов хранятся в общем кэше по отпечатку набора и фильтрам, от которых они зависят
+def run_dashboard(cube, index=None):
+    # Определение минимальной и максимальной даты
+    min_date = cube.min_date()
+    max_date = cube.max_date()
+    memory = getattr(index, 'attrs', {}).get('memory')
+    if memory:
+        # Объём таблицы транзакций до и после приведения к компактной схеме
+        st.sidebar.caption(f"Память таблицы: {memory['raw_bytes'] / 2 ** 20:.1f} МБ → {memory['bytes'] / 2 ** 20:.1f} МБ")
+    # Боковая панель с фильтрами
+    st.sidebar.subheader('Фильтры')
+    # Фильтр диапазона дат
+    start_date = st.sidebar.date_input('Выберите начальную дату', value=min_date, min_value=min_date, max_value=max_date)
+    end_date = st.sidebar.date_input('Выберите конечную дату', value=max_date, min_value=min_date, max_value=max_date)
+    # Проверка, совпадают ли начальная и конечная даты
+    same_date = start_date == end_date
+
+    filtered_data = None
+    view = cube
+    # Окно строк: даты и минуты суток
+    window = (start_date, end_date)
+    if index is not None and same_date:
+        # Фильтр диапазона времени только при совпадающих датах
+        start_time = st.sidebar.time_input('Выберите начальное время', value=datetime.time(0, 0))
+        end_time = st.sidebar.time_input('Выберите конечное время', value=datetime.time(23, 59))
+        window = (start_date, end_date, minute_of_day(start_time), minute_of_day(end_time))
+        # Фильтрация данных по дате и времени: строки одного дня
+        filtered_data, view = window_view(index, window)
+
+    with st.container():
+        st.markdown('---')
+        st.title('Анализ данных')
+        st.markdown('---')
+        if index is not None:
             # Первые 10 строк отфильтрованных данных
             with st.expander("Посмотреть первые 10 строк"):
                 st.subheader('Отфильтрованные данные')
-                st.dataframe(filtered_data.head(10), use_container_width=True)
+                first_rows = cached_result('first_rows', window, lambda: display_rows(index.page(*window, limit=10)))
+                st.dataframe(first_rows, use_container_width=True)
             st.markdown('---')
-            # Все строки 
+            # Все строки: в браузер передаётся только текущая страница
             with st.expander("Посмотреть все отфильтрованные строки"):
-                st.dataframe(filtered_data, use_container_width=True)
+                products = cached_result('products', window, lambda: view.by_article(start_date, end_date).index)
+                show_rows_page(index, window, products)
             st.markdown('---')
-
-
-
-            # Топ-10 продаж за выбранный период
-            top_sales = filtered_data.groupby('article')['Quantity'].sum().nlargest(10).reset_index()
-
-            # Преобразование столбца 'total_price' в числовой тип данных
-            
-            filtered_data['total_price'] = pd.to_numeric(filtered_data['total_price'], errors='coerce')
-
-            # Удаление строк с некорректными значениями
-            filtered_data = filtered_data.dropna(subset=['total_price'])
-
-            # Топ-10 продуктов по сумме продаж за выбранный период
-            top_products = filtered_data.groupby('article')['total_price'].sum().nlargest(10).reset_index()
-
-
-
-
-
-            
-
-            # Показать только первые 10 строк топ-10 продаж
-            st.write("10 самых часто продаваемых продуктов")
-            st.dataframe(top_sales, use_container_width=True)
-            
-            top_salesexc = convert_df(top_sales)
-            st.download_button(
-                label="Скачать в фомате .xlsx",
-                data=top_salesexc,
-                file_name='top_sales.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
-            st.markdown('---')
-
-
-            # Данные для графика "10 самых часто продаваемых продуктов"
-            top_sales_data = top_sales.set_index('article')['Quantity']
-
-            # Создание графика
-            fig1 = go.Figure(data=[go.Pie(labels=top_sales_data.index, values=top_sales_data)])
-
-            # Настройка макета и заголовка
-            fig1.update_layout(title='10 самых часто продаваемых продуктов')
-            
-
-            # Отображение графика в Streamlit
-            st.plotly_chart(fig1, use_container_width=True)
-
-            st.markdown('---')
-            # Показать только первые 10 строк 10 самых часто продаваемых продуктов
-            st.write("Топ-10 продуктов по сумме продаж")
-            st.dataframe(top_products, use_container_width=True)
-
-
-            top_sales_dataexc = convert_df(top_sales_data)
-            st.download_button(
-                label="Скачать в фомате .xlsx",
-                data=top_sales_dataexc,
-                file_name='top_sales_data.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
-            st.markdown('---')
-
-
-            # Данные для графика "Топ-10 продуктов по сумме продаж"
-            top_products_data = top_products.set_index('article')['total_price']
-
-            # Создание круговой диаграммы
-            fig2 = go.Figure(data=[go.Pie(labels=top_products_data.index, values=top_products_data)])
-            
-
-            # Настройка макета и заголовка
-            fig2.update_layout(title='Топ-10 продуктов по сумме продаж')
-
-            # Отображение графика в Streamlit
-            st.plotly_chart(fig2, use_container_width=True)
+        else:
+            st.caption(f'Потоковый режим: обработано строк — {cube.rows}')
             st.markdown('---')
 
-
-
-        colgr1, colgr2 = st.columns(2)
-        # Конвертация столбца 'total_price' в числовой тип данных
-        data['total_price'] = pd.to_numeric(data['total_price'], errors='coerce')
-
-        with colgr1:
-            # Выбор года с помощью виджета
-            selected_year11 = st.selectbox('Выберите год', data['date'].dt.year.unique())
-            # Фильтрация данных по выбранному году
-            filtered_data11 = data[data['date'].dt.year == selected_year11]
-            # Группировка данных по месяцу и суммирование выручки
-            revenue_by_month11 = filtered_data11.groupby(filtered_data11['date'].dt.month)['total_price'].sum().reset_index()
-            # Преобразование числовых значений месяцев в названия
-            revenue_by_month11['date'] = revenue_by_month11['date'].apply(lambda x: calendar.month_name[x])
-        with colgr2:
-            # Выбор типа графика с помощью селектбокса
-            chart_type = st.selectbox('Выберите тип графика', ['Гистограмма', 'Круговая диаграмма'])
-        with st.container():
-            if chart_type == 'Гистограмма':
-                # Создание графика выручки по месяцам
-                fig = go.Figure(data=[go.Bar(x=revenue_by_month11['date'], y=revenue_by_month11['total_price'])])
-                fig.update_layout(
-                    title=f'Выручка по месяцам ({selected_year11})',
-                    xaxis_title='Месяц',
-                    yaxis_title='Выручка'
-                )
-                fig.update_layout()
-                st.plotly_chart(fig, use_container_width=True)
-            elif chart_type == 'Круговая диаграмма':
-                # Создание круговой диаграммы выручки по месяцам
-                fig = go.Figure(data=[go.Pie(labels=revenue_by_month11['date'], values=revenue_by_month11['total_price'])])
-                fig.update_layout(
-                    title=f'Круговая диаграмма выручки по месяцам ({selected_year11})'
-                )
-                fig.update_layout()
-                st.plotly_chart(fig, use_container_width=True)
-        st.markdown('---')
-
-        
-
-
-
-
-
-    
-
-
-
-        if same_date:
-            # Фильтрация данных по выбранному дню
-            filtered_data_single_day = filtered_data[filtered_data['date'] == start_date]
-
-            if not filtered_data_single_day.empty:
-                # Группировка данных по времени и суммирование продаж
-                sales_by_time = filtered_data_single_day.groupby('time')['Quantity'].sum()
-
-                # Преобразование времени в формат строки для правильного отображения на графике
-                sales_by_time_numeric = pd.DataFrame({'time': sales_by_time.index, 'sales': sales_by_time.values})
-                sales_by_time_numeric['time'] = sales_by_time_numeric['time'].apply(lambda x: x.strftime('%H:%M'))
-
-                # Создание графика почасовой динамики продаж с датой и днем недели
-                fig_hourly = go.Figure()
-                fig_hourly.add_trace(go.Scatter(
-                    x=sales_by_time_numeric['time'],
-                    y=sales_by_time_numeric['sales'],
-                    mode='lines',
-                    name=start_date.strftime('%A (%d.%m.%Y)'),
-                    hovertext=[f'{start_date.strftime("%A (%d.%m.%Y)")} {time}' for time in sales_by_time_numeric['time']],
-                    hovertemplate='<b>%{hovertext}</b><br>Продажи: %{y}'
-                ))
-                fig_hourly.update_layout(
-                    title='Почасовая динамика продаж (в пределах одного дня)',
-                    xaxis_title='Время',
-                    yaxis_title='Количество продаж',
-                    xaxis_tickformat='%H:%M'
-                )
-                st.plotly_chart(fig_hourly, use_container_width=True)
+        # Топ-10 продаж и продуктов по сумме продаж за выбранный период
+        top_sales, top_products = cached_result('tops', window, lambda: (
+            view.top('Quantity', start_date, end_date), view.top('total_price', start_date, end_date)))
+        show_top(top_sales, 'Quantity', '10 самых часто продаваемых продуктов', 'top_sales.xlsx', window)
+        show_top(top_products, 'total_price', 'Топ-10 продуктов по сумме продаж', 'top_products.xlsx', window)
+        show_article_forecast(cube)
+        show_basket(index, start_date, end_date)
+
+    show_revenue_section(cube)
+    st.markdown('---')
+
+    if same_date:
+        def minute_dynamics():
+            if filtered_data is not None:
+                # Поминутная динамика по строкам выбранного дня
+                sales_by_time = filtered_data.groupby('minute')[MEASURES].sum()
+                sales_by_time.index = MINUTE_LABELS[sales_by_time.index.to_numpy()]
             else:
-                st.write('Нет данных для выбранного дня.')
+                # В потоковом режиме внутри дня доступна только почасовая детализация
+                sales_by_time = view.by_hour(start_date, end_date)
+                sales_by_time.index = HOUR_LABELS[sales_by_time.index.to_numpy()]
+            return sales_by_time
+        sales_by_time = cached_result('dynamics', window, minute_dynamics)
+        day_name = f"{WEEKDAY_NAMES[start_date.weekday()]} ({start_date.strftime('%d.%m.%Y')})"
+        if not sales_by_time.empty:
+            show_dynamics(sales_by_time.index, sales_by_time['Quantity'], f'{day_name} %{{x}}',
+                          'Почасовая динамика продаж (в пределах одного дня)',
+                          'Время', 'Количество продаж', day_name, window)
         else:
-            # Группировка данных по дате и суммирование продаж
-            sales_by_date = filtered_data.groupby('date')['Quantity'].sum()
-            # Создание графика динамики продаж с датой и днем недели
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=sales_by_date.index,
-                y=sales_by_date.values,
-                mode='lines',
-                name='Динамика продаж',
-                hovertext=[f'{date.strftime("%A (%d.%m.%Y)")}' for date in sales_by_date.index],
-                hovertemplate='<b>%{hovertext}</b><br>Продажи: %{y}'
-            ))
-            fig.update_layout(
-                title='Динамика продаж',
-                xaxis_title='Дата',
-                yaxis_title='Количество продаж'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.write('Нет данных для выбранного дня.')
         st.markdown('---')
-
-
-
-
-
-
-
-
-
-        if same_date:
-            # Фильтрация данных по выбранному дню
-            filtered_data_single_day = filtered_data[filtered_data['date'] == start_date]
-
-            if not filtered_data_single_day.empty:
-                # Группировка данных по времени и суммирование продаж
-                sales_by_time = filtered_data_single_day.groupby('time')['total_price'].sum()
-
-                # Удаление нулевых значений
-                sales_by_time = sales_by_time[sales_by_time > 0]
-
-                if not sales_by_time.empty:
-                    # Преобразование времени в формат строки для правильного отображения на графике
-                    sales_by_time_numeric = pd.DataFrame({'time': sales_by_time.index, 'sales': sales_by_time.values})
-                    sales_by_time_numeric['time'] = sales_by_time_numeric['time'].apply(lambda x: x.strftime('%H:%M'))
-
-                    # Создание графика почасовой динамики продаж по сумме продаж с датой и днем недели
-                    fig_hourly_sales = go.Figure()
-                    fig_hourly_sales.add_trace(go.Scatter(
-                        x=sales_by_time_numeric['time'],
-                        y=sales_by_time_numeric['sales'],
-                        mode='lines',
-                        name=start_date.strftime('%A (%d.%m.%Y)'),
-                        hovertext=[f'{start_date.strftime("%A (%d.%m.%Y)")} {time}' for time in sales_by_time_numeric['time']],
-                        hovertemplate='<b>%{hovertext}</b><br>Сумма продаж: %{y}'
-                    ))
-                    fig_hourly_sales.update_layout(
-                        title='Почасовая динамика продаж по сумме продаж (в пределах одного дня)',
-                        xaxis_title='Время',
-                        yaxis_title='Сумма продаж',
-                        xaxis_tickformat='%H:%M'
-                    )
-                    st.plotly_chart(fig_hourly_sales, use_container_width=True)
-                else:
-                    st.write('Нет данных для выбранного дня.')
-            else:
-                st.write('Нет данных для выбранного дня.')
+        # Удаление нулевых значений
+        sales_by_time = sales_by_time[sales_by_time['total_price'] > 0]
+        if not sales_by_time.empty:
+            show_dynamics(sales_by_time.index, sales_by_time['total_price'], f'{day_name} %{{x}}',
+                          'Почасовая динамика продаж по сумме продаж (в пределах одного дня)',
+                          'Время', 'Сумма продаж', day_name, window, 'Сумма продаж')
         else:
-            # Фильтрация данных по выбранному временному диапазону
-            filtered_data_range = filtered_data[(filtered_data['date'] >= start_date) & (filtered_data['date'] <= end_date)]
-
-            if not filtered_data_range.empty:
-                # Группировка данных по дате и суммирование продаж
-                sales_by_date = filtered_data_range.groupby('date')['total_price'].sum()
-
-                # Удаление нулевых значений
-                sales_by_date = sales_by_date[sales_by_date > 0]
-
-                if not sales_by_date.empty:
-                    # Создание графика динамики продаж по сумме продаж с датой и днем недели
-                    fig_sales = go.Figure()
-                    fig_sales.add_trace(go.Scatter(
-                        x=[date.strftime('%d.%m.%Y') for date in sales_by_date.index],
-                        y=sales_by_date.values,
-                        mode='lines',
-                        name='Динамика продаж по сумме',
-                        hovertext=[date.strftime("%A (%d.%m.%Y)") for date in sales_by_date.index],
-                        hovertemplate='<b>%{hovertext}</b><br>Сумма продаж: %{y:.2f}'
-                    ))
-                    fig_sales.update_layout(
-                        title='Динамика продаж по сумме',
-                        xaxis_title='Дата',
-                        yaxis_title='Сумма продаж'
-                    )
-                    st.plotly_chart(fig_sales, use_container_width=True)
-                else:
-                    st.write('Нет данных для отображения динамики продаж по сумме.')
-            else:
-                st.write('Нет данных для выбранного временного диапазона.')
-        st.markdown('---')                             
-
-            
-
-
-
-
-
-
-
-
-
-
-
-    
-        # Определение минимальной и максимальной даты
-        min_date_chart = data['date'].min().date()
-        max_date_chart = data['date'].max().date()
-
-        
-
-    
-        with st.container():
-            col3, col4 = st.columns(2)
-            with col3:
-                # Фильтр даты
-                start_date_chart = st.date_input('Выберите начальную дату', min_value=min_date_chart, max_value=max_date_chart, key='start_date', value=min_date_chart)
-            with col4:
-                end_date_chart = st.date_input('Выберите конечную дату', min_value=min_date_chart, max_value=max_date_chart, key='end_date', value=max_date_chart)
-
-
-
-            # Фильтрация данных только по дате
-            filtered_data_chart = data[(data['date'] >= pd.to_datetime(start_date_chart)) & (data['date'] <= pd.to_datetime(end_date_chart))]
-
-            # Удаление времени из столбца 'date'
-            filtered_data_chart['date'] = filtered_data_chart['date'].dt.date
-
-            # Удаление даты из столбца 'time'
-            filtered_data_chart['time'] = filtered_data_chart['time'].dt.time
-
-            
-            # Фильтр продуктов
-            selected_products_chart = st.multiselect('Выберите продукты', filtered_data_chart['article'].unique())
-
-            if selected_products_chart and start_date_chart and end_date_chart:
-                # Фильтрация данных по выбранным продуктам и дате
-                filtered_data_selected_products = filtered_data_chart[
-                    (filtered_data_chart['article'].isin(selected_products_chart)) &
-                    (filtered_data_chart['date'] >= start_date_chart) & (filtered_data_chart['date'] <= end_date_chart)
-                ]
-
-                if not filtered_data_selected_products.empty:
-                    # Группировка данных по продукту, дате и суммирование продаж
-                    sales_by_product_date = filtered_data_selected_products.groupby(['article', 'date'])['Quantity'].sum().reset_index()
-
-                    # Создание графика динамики продаж по каждому продукту
-                    fig_sales_by_product = go.Figure()
-
-                    for product in selected_products_chart:
-                        data_product = sales_by_product_date[sales_by_product_date['article'] == product]
-                        fig_sales_by_product.add_trace(go.Scatter(
-                            x=data_product['date'],
-                            y=data_product['Quantity'],
-                            mode='lines',
-                            name=product,
-                            hovertext=[f'{date.strftime("%A (%d.%m.%Y)")}: {quantity}' for date, quantity in
-                                    zip(data_product['date'], data_product['Quantity'])],
-                            hovertemplate='<b>%{hovertext}</b><br>Продажи: %{y}'
-                        ))
-
-                    fig_sales_by_product.update_layout(
-                        title='Динамика продаж по продуктам',
-                        xaxis_title='Дата',
-                        yaxis_title='Количество продаж',
-                        legend=dict(orientation='h', yanchor='top', xanchor='left', x=0, y=1.2)
-                    )
-
-                    # Установка размера графика
-                    fig_sales_by_product.update_layout(height=400, width=600)  #height=600, width=1000
-
-                    st.plotly_chart(fig_sales_by_product, use_container_width=True)
-            st.markdown('---')  
-            st.subheader('Анализ распределения цен') 
-            col10, col20 = st.columns(2)
-            with col10:
-                
-                # Визуализация распределения цен
-                       
-                price_data = pd.to_numeric(data['unit_price'].str.replace(',', '.'))
-                description = price_data.describe()
-                # Настройка русского языка для описания
-                description = description.rename(index={
-                    'count': 'Количество',
-                    'mean': 'Среднее',
-                    'std': 'Стандартное отклонение',
-                    'min': 'Минимум',
-                    '25%': '25-й перцентиль',
-                    '50%': 'Медиана',
-                    '75%': '75-й перцентиль',
-                    'max': 'Максимум',
-                })
-                st.write(description)
-            with col20:
-                with st.expander("Пояснение"):
-                    st.write('count - общее количество значени;')
-                    st.write('mean - среднее значение цены;')
-                    st.write('std - стандартное отклонение, которое измеряет разброс значений относительно их среднего значения и указывает на степень вариации цен;')
-                    st.write('min - минимальное значение;')
-                    st.write('25% - 25-й перцентиль - значение, ниже которого находится 25% значений столбца;')
-                    st.write('50% - Медиана - Это показатель, который указывает на цену, ниже которой находится 50% продуктов.;')
-                    st.write('75% - 75-й перцентиль - значение, ниже которого находится 75% значений столбц;')
-                    st.write('max - максимальное значение.')                
-            # Построение гистограммы цен
-            fig = go.Figure(data=[go.Histogram(x=price_data)])
-            fig.update_layout(
-                title='Распределение цен',
-                xaxis_title='Цена',
-                yaxis_title='Частота'
-            )
-            fig = to_russian(fig)
-            st.plotly_chart(fig)
-
-
-            col11, col21 = st.columns(2)
-            with col11:
-                # Преобразование столбца 'total_price' в строковый тип
-                filtered_data['total_price'] = filtered_data['total_price'].astype(str)
-
-                # Замена запятой на точку в столбце 'total_price' только для строковых значений
-                filtered_data['total_price'] = filtered_data['total_price'].where(
-                    filtered_data['total_price'].apply(lambda x: isinstance(x, str)),
-                    filtered_data['total_price'].str.replace(',', '.')
-                )
-
-                # Преобразование столбца 'total_price' обратно в тип float
-                filtered_data['total_price'] = filtered_data['total_price'].astype(float)
-
-                # Извлечение часа из столбца 'time' в отдельный столбец 'hour'
-                filtered_data['hour'] = filtered_data['time'].apply(lambda x: x.hour)
-
-                # Создание сводной таблицы по часу дня
-                sales_by_hour = filtered_data.groupby('hour')['total_price'].sum().reset_index()
-
-                # Переименование колонок на русском языке
-                sales_by_hour = sales_by_hour.rename(columns={'hour': 'Час', 'total_price': 'Сумма продаж'})
+            st.write('Нет данных для выбранного дня.')
+    else:
+        # Группировка данных по дате и суммирование продаж
+        sales_by_date = cached_result('dynamics', window, lambda: view.by_day(start_date, end_date))
+        anomalies = dataset_anomalies(cube)
+        show_dynamics(sales_by_date.index, sales_by_date['Quantity'], HOVER_DATE,
+                      'Динамика продаж', 'Дата', 'Количество продаж', 'Динамика продаж', window,
+                      anomalies=anomalies_between(anomalies, start_date, end_date))
+        st.markdown('---')
+        # Удаление нулевых значений
+        sales_by_date = sales_by_date[sales_by_date['total_price'] > 0]
+        if not sales_by_date.empty:
+            show_dynamics(sales_by_date.index, sales_by_date['total_price'], HOVER_DATE,
+                          'Динамика продаж по сумме', 'Дата', 'Сумма продаж', 'Динамика продаж по сумме',
+                          window, 'Сумма продаж', ':.2f',
+                          anomalies=anomalies_between(anomalies, start_date, end_date, 'total_price'))
+        else:
+            st.write('Нет данных для отображения динамики продаж по сумме.')
+    st.markdown('---')
 
-                # Отображение сводной таблицы по часу дня
-                st.subheader('Продажи по часу дня')
-                st.write(sales_by_hour)
+    with st.container():
+        show_product_dynamics(cube, min_date, max_date)
+        st.markdown('---')
 
-            with col21:
-                # Преобразование столбца 'date' в тип datetime
-                filtered_data['date'] = pd.to_datetime(filtered_data['date'])
+        # Распределение цен по частотам значений
+        price_description, price_counts = cached_result('prices', (), lambda: (
+            cube.price_description(), cube.price_counts()))
+        show_price_analysis(price_description, price_counts.index, price_counts.values)
+
+        # Сводные таблицы по часу дня и дню недели за период боковой панели
+        sales_by_hour, sales_by_day_of_week = cached_result('pivots', window, lambda: (
+            view.by_hour(start_date, end_date)['total_price'].reset_index(),
+            view.by_weekday(start_date, end_date)['total_price'].reset_index()))
+        show_pivots(sales_by_hour, sales_by_day_of_week)
+
+    st.markdown('---')
+    # Полный отчёт по текущим фильтрам: листы собираются только по кнопке,
+    # строки передаются блоками, файл пишется на диск
+    def make_sheets():
+        sheets = {}
+        if index is not None:
+            # Строки читаются блоками только при формировании отчёта
+            sheets['Отфильтрованные строки'] = (display_rows(chunk) for chunk in index.iter_rows(*window))
+        sheets.update(build_report(view, start_date, end_date))
+        return sheets
+    show_report_export(make_sheets)
 
-                # Создание нового столбца для дня недели
-                filtered_data['day_of_week'] = filtered_data['date'].dt.day_name()
+def run_app():
 
-                # Создание сводной таблицы по дню недели
-                sales_by_day_of_week = filtered_data.groupby('day_of_week')['total_price'].sum().reset_index()
+    index = None
+    cube = None
+    # Отпечаток набора данных сессии: режим, хэш файла и применённых партий
+    dataset = None
+    container = st.empty()  # Создание пустого контейнера для отображения содержимого
 
-                # Переименование колонок на русском языке
-                sales_by_day_of_week = sales_by_day_of_week.rename(columns={'day_of_week': 'День недели', 'total_price': 'Сумма продаж'})
+    uploaded_file = st.file_uploader('Загрузите файл CSV', type='csv', key='file_uploader')
+    # Потоковый режим для выгрузок, которые не помещаются в память целиком
+    streaming = st.sidebar.checkbox('Потоковая загрузка (большие файлы)', key='streaming')
+    # Накопление истории в локальной базе: файлы добавляются к ранее загруженным
+    use_warehouse = st.sidebar.checkbox('Хранить историю в локальной базе', key='warehouse')
+    # Замеры времени и памяти по разделам (журнал пишется в файл JSONL)
+    profile = st.sidebar.checkbox('Замеры производительности', value=PROFILE_ENABLED, key='profile')
+    profile_memory = profile and st.sidebar.checkbox('Учитывать пиковую память (tracemalloc)', key='profile_memory')
+    profiler().start_run(profile, profile_memory)
+    with container:
+        if uploaded_file is not None:
+            try:
+                digest = upload_digest(uploaded_file)
+                if use_warehouse:
+                    store_upload(get_warehouse(), uploaded_file)
+                elif streaming:
+                    cube = load_aggregates(digest, uploaded_file)
+                    dataset = ('cube', digest)
+                else:
+                    index, cube = dataset_for(digest, uploaded_file)
+                    dataset = ('rows', digest)
+                # Сообщение показывается только при загрузке нового файла
+                if st.session_state.get('loaded_file') != uploaded_file.name:
+                    st.session_state['loaded_file'] = uploaded_file.name
+                    st.success('Данные успешно загружены!')
+            except:
+                st.error('Неверный файл')
 
-                # Отображение сводной таблицы по дню недели
-                st.subheader('Продажи по дню недели')
-                st.write(sales_by_day_of_week)
+    # Дозагрузка новых партий продаж (CSV того же формата)
+    delta_files = st.sidebar.file_uploader('Добавить новые партии продаж', type='csv',
+                                           accept_multiple_files=True, key='delta_uploader')
+    if delta_files:
+        try:
+            if use_warehouse:
+                for delta_file in delta_files:
+                    store_upload(get_warehouse(), delta_file)
+            elif cube is not None:
+                index, cube = apply_deltas(digest, index, cube, delta_files)
+                dataset += tuple(st.session_state['appended']['deltas'])
+        except:
+            st.sidebar.error('Неверный файл партии')
+
+    if use_warehouse:
+        warehouse = get_warehouse()
+        if not warehouse.empty():
+            # Фильтры панели выполняются запросами к хранилищу; строки хранилища только
+            # добавляются, поэтому версия данных — наибольший номер строки
+            st.session_state['dataset'] = ('warehouse', warehouse.path, warehouse.version)
+            with profiler().section('run_dashboard'):
+                run_dashboard(warehouse, warehouse)
+    elif cube is not None:
+        count, used = shared_datasets().usage()
+        st.sidebar.caption(f'Общий кэш: наборов — {count}, {used / 2 ** 20:.1f} МБ '
+                           f'из {shared_datasets().max_bytes / 2 ** 20:.0f} МБ')
+        st.session_state['dataset'] = dataset
+        with profiler().section('run_dashboard'):
+            run_dashboard(cube, index)
+    results = result_cache()
+    count, used = results.usage()
+    st.sidebar.caption(f'Кэш результатов: {count}, {used / 2 ** 20:.1f} МБ из {results.max_bytes / 2 ** 20:.0f} МБ; '
+                       f'попаданий — {results.hits}, промахов — {results.misses} ({results.hit_rate():.0%})')
+    show_profile()
 
 if __name__ == '__main__':
     # Запуск приложения
 
     st.sidebar.title('Настройки')
-    run_app()
\ No newline at end of file
+    run_app()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from forecasting import make_model
+
+# Каталог сохранённых моделей прогноза
+MODEL_DIR = os.environ.get('BAKERY_MODEL_DIR', os.path.join('.cache', 'models'))
+
+# Порог MAPE прогноза сохранённой модели на новых неделях, выше которого порядок подбирается заново
+DRIFT_MAPE = float(os.environ.get('BAKERY_DRIFT_MAPE', 0.25))
+
+# Полный перебор не реже чем раз в столько добавленных недель
+RESEARCH_WEEKS = int(os.environ.get('BAKERY_RESEARCH_WEEKS', 26))
+
+
+# Отпечаток ряда: хэш значений float64
+def fingerprint(values):
+    return hashlib.sha256(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+# Средняя абсолютная процентная ошибка по ненулевым фактическим значениям
+def mape(actual, forecast):
+    actual = np.asarray(actual, dtype=float)
+    forecast = np.asarray(forecast, dtype=float)
+    mask = actual != 0
+    if not mask.any():
+        return 0.0
+    return float(np.mean(np.abs(actual[mask] - forecast[mask]) / np.abs(actual[mask])))
+
+
+# Хранилище обученных моделей на диске: для каждого ключа — модель (pickle) и описание (JSON):
+# порядок, параметры SARIMAX и отпечаток обучающего ряда. Описание первично:
+# если модель не читается (другая версия библиотек), она восстанавливается по параметрам
+class ModelStore:
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+
+    def _path(self, key, extension):
+        return os.path.join(self.model_dir, f'{key}.{extension}')
+
+    def load(self, key):
+        try:
+            with open(self._path(key, 'json'), encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None, None
+        try:
+            with open(self._path(key, 'pkl'), 'rb') as model_file:
+                model = pickle.load(model_file)
+        except Exception:
+            model = None
+        return model, meta
+
+    # Атомарная запись: сначала во временные файлы, затем переименование
+    def save(self, key, model, meta):
+        os.makedirs(self.model_dir, exist_ok=True)
+        for extension, mode, write in (
+            ('pkl', 'wb', lambda handle: pickle.dump(model, handle)),
+            ('json', 'w', lambda handle: json.dump(meta, handle, ensure_ascii=False, indent=2)),
+        ):
+            path = self._path(key, extension)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as handle:
+                write(handle)
+            os.replace(tmp_path, path)
+
+
+def _describe(model, values, searched_weeks, action):
+    return {
+        'order': list(model.order),
+        'seasonal_order': list(model.seasonal_order),
+        'with_intercept': bool(model.with_intercept),
+        'params': np.asarray(model.params(), dtype=float).tolist(),
+        'weeks': len(values),
+        'fingerprint': fingerprint(values),
+        'prefix_fingerprint': fingerprint(values[:-1]),
+        'searched_weeks': searched_weeks,
+        'action': action,
+    }
+
+
+# Восстановление модели по сохранённым параметрам (без перебора)
+def _restore(meta, values):
+    model = make_model(tuple(meta['order']), tuple(meta['seasonal_order']), meta['with_intercept'],
+                       maxiter=0, start_params=np.asarray(meta['params']))
+    return model.fit(values)
+
+
+# Модель для ряда с учётом сохранённой:
+#  - ряд не изменился — модель используется как есть;
+#  - добавлены недели — модель дообучается с текущих параметров (ARIMA.update);
+#  - изменилась только последняя, неполная неделя — тот же порядок обучается заново
+#    с сохранённых параметров;
+#  - история изменилась, ошибка на новых неделях выше drift_mape или с последнего
+#    перебора добавлено research_weeks недель — порядок подбирается заново через search(values).
+# Возвращает модель и выполненное действие
+def fit_or_update(store, key, series, search, drift_mape=DRIFT_MAPE, research_weeks=RESEARCH_WEEKS, force=False):
+    values = np.asarray(series, dtype=float).ravel()
+    model, meta = (None, None) if force else store.load(key)
+
+    def researched(reason):
+        model = search(values)
+        store.save(key, model, _describe(model, values, len(values), reason))
+        return model, reason
+
+    if meta is None:
+        return researched('search')
+    weeks = meta['weeks']
+    if len(values) >= weeks and fingerprint(values[:weeks]) == meta['fingerprint']:
+        known = weeks
+    elif len(values) >= weeks and weeks > 1 and fingerprint(values[:weeks - 1]) == meta['prefix_fingerprint']:
+        known = weeks - 1
+    else:
+        return researched('history changed')
+    if model is None:
+        model = _restore(meta, values[:weeks])
+    if known == weeks == len(values):
+        return model, 'reused'
+    if len(values) - meta['searched_weeks'] >= research_weeks:
+        return researched('scheduled search')
+    # Точность сохранённой модели на неделях, которых она не видела
+    if len(values) > weeks:
+        error = mape(values[weeks:], model.predict(len(values) - weeks))
+        if error > drift_mape:
+            return researched(f'drift (MAPE {error:.1%})')
+    if known == weeks:
+        model.update(values[weeks:])
+        action = 'updated'
+    else:
+        model = make_model(model.order, model.seasonal_order, model.with_intercept,
+                           maxiter=max(5, len(values) // 10), start_params=model.params()).fit(values)
+        action = 'warm start'
+    store.save(key, model, _describe(model, values, meta['searched_weeks'], action))
+    return model, action
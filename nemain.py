@@ -7,39 +7,62 @@ from statsmodels.tsa.stattools import adfuller
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from sklearn.metrics import mean_squared_error
 import math
+import os
+from functools import partial
 
-from pmdarima import auto_arima
+from backtest import backtest, baseline, fixed_sarima, searched_sarima
+from forecasting import search_orders
+from ingest import load_sales
+from model_store import ModelStore, fit_or_update
 
 
-data = pd.read_csv('Bakery_sales.csv', delimiter=';', encoding='Windows-1251', dtype={'unit_price': float, 'total_price': float}, decimal=',')
+if __name__ == '__main__':
+    # Разобранная выгрузка берётся из кэша Parquet, если файл не менялся
+    with open('Bakery_sales.csv', 'rb') as csv_file:
+        digest, data = load_sales(csv_file)
 
+    # Установка столбца 'date' в качестве индекса
+    data.set_index('date', inplace=True)
+    #Удаление отрицательных значений
+    data = data[(data['unit_price'] > 0) & (data['Quantity'] > 0)]
+    #Создание таблицы еждневных продаж
+    daily_sales = data['total_price'].astype('float64').groupby(level='date').sum().to_frame()
+    #train - test split
+    #creating a table of weekly sales
+    weekly_sales = daily_sales.resample('W').sum()
+    train = weekly_sales[:int(0.7*len(weekly_sales))]
+    test = weekly_sales[int(0.7*len(weekly_sales)):]
 
-# Преобразование столбца 'date' в тип datetime
-data['date'] = pd.to_datetime(data['date'], dayfirst=True)
+    # Полный перебор порядков: тест ADF и подбор SARIMA по AIC в пуле процессов
+    # (та же сетка, что у auto_arima(stepwise=False))
+    def search(values):
+        result = adfuller(weekly_sales)
+        # Печать результата теста
+        print('ADF Statistic:', result[0])
+        print('p-value:', result[1])
+        model, candidates = search_orders(values, m=52, D=1, max_p=5, max_q=5, max_P=3, max_Q=3,
+                                          maxiter=50, trace=True)
+        print(candidates.sort_values('aic').head(10).to_string(index=False))
+        return model
 
-#converting time to datetime
-data['time'] = pd.to_datetime(data['time'], format="%H:%M")
-# Установка столбца 'date' в качестве индекса
-data.set_index('date', inplace=True)
-#Удаление отрицательных значений
-data = data[(data['unit_price'] > 0) & (data['Quantity'] > 0)]
-#Создание таблицы еждневных продаж
-daily_sales = data.groupby('date').agg({'total_price':'sum'}).reset_index()
-#set date as index
-daily_sales.set_index('date', inplace = True)
-#train - test split
-#creating a table of weekly sales
-weekly_sales = daily_sales.resample('W').sum()
-result = adfuller(weekly_sales)
+    # Сохранённая модель дообучается на новых неделях; перебор — только при первом запуске,
+    # изменении истории или падении точности
+    model_auto_arima, action = fit_or_update(ModelStore(), 'weekly_sales', train['total_price'], search)
+    print(f'Модель {model_auto_arima.order}{model_auto_arima.seasonal_order}: {action}')
 
-# Печать результата теста
-print('ADF Statistic:', result[0])
-print('p-value:', result[1])
-train = weekly_sales[:int(0.7*len(weekly_sales))]
-test = weekly_sales[int(0.7*len(weekly_sales)):]
-
-model_auto_arima = auto_arima(train, trace=True,start_p=0, start_q=0, start_P=0, start_Q=0,
-                  max_p=5, max_q=5, max_P=3, max_Q=3, seasonal=True,maxiter=50,m = 52, D = 1,
-                  information_criterion='aic',stepwise=False, suppress_warnings=True,
-                  error_action='ignore',approximation = False)
-model_auto_arima.fit(train)
\ No newline at end of file
+    # Скользящая проверка на тестовом периоде: выбранный порядок, переобучаемый на каждом
+    # отрезке, против дешёвых базовых моделей; перебор порядка на каждом отрезке очень
+    # дорог и включается переменной окружения BAKERY_BACKTEST_SEARCH=1
+    candidates = {
+        'Сезонный наивный': partial(baseline, name='naive'),
+        'Экспоненциальное сглаживание': partial(baseline, name='ses'),
+        f'SARIMA{model_auto_arima.order}{model_auto_arima.seasonal_order}': partial(
+            fixed_sarima, order=model_auto_arima.order, seasonal_order=model_auto_arima.seasonal_order,
+            with_intercept=model_auto_arima.with_intercept),
+    }
+    if os.environ.get('BAKERY_BACKTEST_SEARCH') == '1':
+        candidates['Перебор SARIMA'] = searched_sarima
+    by_horizon, summary = backtest(weekly_sales['total_price'], candidates, horizon=4, initial=len(train), step=4)
+    print(f"Скользящая проверка, отрезков: {summary.attrs['folds']}")
+    print(summary.to_string())
+    print(by_horizon.pivot(index='step', columns='model', values='rmse').to_string())
@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from aggregates import SalesCube
+from export import write_report_file
+from ingest import read_sales_csv
+
+# Подписи описательной статистики цен
+DESCRIPTION_LABELS = {
+    'count': 'Количество',
+    'mean': 'Среднее',
+    'std': 'Стандартное отклонение',
+    'min': 'Минимум',
+    '25%': '25-й перцентиль',
+    '50%': 'Медиана',
+    '75%': '75-й перцентиль',
+    'max': 'Максимум',
+}
+
+
+# Выручка по месяцам всех лет набора данных
+def revenue_by_year_month(cube):
+    tables = []
+    for year in cube.years():
+        revenue = cube.revenue_by_month(year).rename(columns={'date': 'month'})
+        revenue.insert(0, 'year', int(year))
+        tables.append(revenue)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=['year', 'month', 'total_price'])
+
+
+# Все аналитические таблицы панели без Streamlit: куб (или хранилище) и период
+def build_report(cube, start_date=None, end_date=None):
+    start_date = start_date or cube.min_date()
+    end_date = end_date or cube.max_date()
+    description = cube.price_description().rename(index=DESCRIPTION_LABELS)
+    return {
+        'Топ продаж': cube.top('Quantity', start_date, end_date),
+        'Топ по сумме продаж': cube.top('total_price', start_date, end_date),
+        'Выручка по месяцам': revenue_by_year_month(cube),
+        'Динамика по дням': cube.by_day(start_date, end_date).reset_index(),
+        'Почасовая динамика': cube.by_hour(start_date, end_date).reset_index(),
+        'Продажи по часу дня': cube.by_hour(start_date, end_date)['total_price'].reset_index(),
+        'Продажи по дню недели': cube.by_weekday(start_date, end_date)['total_price'].reset_index(),
+        'Статистика цен': description.rename_axis('Показатель').reset_index(),
+    }
+
+
+# Отчёт по одному файлу магазина (выполняется в отдельном процессе)
+def report_for_file(path, out_dir, extension='xlsx'):
+    started = time.perf_counter()
+    with open(path, 'rb') as csv_file:
+        data = read_sales_csv(csv_file)
+    cube = SalesCube.from_frame(data)
+    store = os.path.splitext(os.path.basename(path))[0]
+    report_path = os.path.join(out_dir, f'{store}.{extension}')
+    write_report_file(report_path, build_report(cube), extension)
+    return {'store': store, 'rows': len(data), 'seconds': round(time.perf_counter() - started, 3),
+            'report': report_path}
+
+
+# Столбцы сводки пакетного построения (error — только у выгрузок с ошибкой)
+SUMMARY_COLUMNS = ['store', 'rows', 'seconds', 'report', 'error']
+
+
+# Отчёты по всем CSV каталога параллельно в пуле процессов
+def build_reports(input_dir, out_dir, workers=None, extension='xlsx'):
+    paths = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.lower().endswith('.csv')
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(report_for_file, path, out_dir, extension): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                store = os.path.splitext(os.path.basename(futures[future]))[0]
+                result = {'store': store, 'rows': 0, 'seconds': None, 'report': None, 'error': str(error)}
+            print(f"{result['store']}: {result.get('error') or result['report']}", flush=True)
+            results.append(result)
+    summary = pd.DataFrame(results, columns=SUMMARY_COLUMNS).sort_values('store')
+    summary.to_csv(os.path.join(out_dir, 'summary.csv'), index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетное построение отчётов по выгрузкам магазинов')
+    parser.add_argument('input_dir', help='каталог с CSV-выгрузками магазинов')
+    parser.add_argument('--out', default='reports', help='каталог для отчётов')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='число процессов')
+    parser.add_argument('--format', choices=['xlsx', 'zip'], default='xlsx', help='формат отчёта')
+    args = parser.parse_args(argv)
+    summary = build_reports(args.input_dir, args.out, args.workers, args.format)
+    if summary.empty:
+        print(f'В каталоге {args.input_dir} нет файлов CSV', file=sys.stderr)
+        return 1
+    return 1 if summary['error'].notna().any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import datetime
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from plotly.basedatatypes import BaseFigure
+
+from charts import figure_bytes
+from ingest import memory_bytes
+
+# Бюджет памяти кэша результатов разделов панели на процесс сервера
+RESULT_CACHE_BYTES = int(os.environ.get('BAKERY_RESULT_CACHE_BYTES', 256 * 1024 ** 2))
+
+
+# Параметры фильтров в единой форме, чтобы одинаковые фильтры давали один ключ:
+# даты — Timestamp, списки и индексы — кортежи, множества — упорядоченные кортежи,
+# числа numpy — числа Python
+def normalize_key(value):
+    if isinstance(value, (datetime.date, pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(normalize_key(item) for item in value))
+    if isinstance(value, (tuple, list, pd.Index)):
+        return tuple(normalize_key(item) for item in value)
+    return value
+
+
+# Приблизительный объём результата в памяти, байт: таблицы — по столбцам,
+# фигуры — по массивам данных трасс, наборы данных — по их собственной оценке
+def result_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return memory_bytes(value)
+    if isinstance(value, BaseFigure):
+        return figure_bytes(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(result_bytes(item) for item in value)
+    nbytes = getattr(value, 'nbytes', None)
+    if callable(nbytes):
+        return nbytes()
+    if nbytes is not None:
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+# Общий для сессий кэш результатов (агрегатные таблицы, фигуры) с бюджетом памяти
+# и вытеснением давно не использованных. Ключ — отпечаток набора данных и параметры
+# фильтров; результаты только читаются, поэтому сессии получают одни и те же объекты
+class ResultCache:
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # Результат по ключу; при промахе вычисляется и сохраняется, если помещается в бюджет
+    def get(self, key, compute):
+        key = normalize_key(key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = compute()
+        size = result_bytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    # Число результатов и занятый ими объём, байт
+    def usage(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+    # Доля попаданий среди всех обращений
+    def hit_rate(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return self.hits / requests if requests else 0.0
@@ -0,0 +1,53 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Бюджет памяти общего кэша наборов данных на процесс сервера
+SHARED_MEMORY_BYTES = int(os.environ.get('BAKERY_SHARED_MEMORY_BYTES', 2 * 1024 ** 3))
+
+
+# Общий для всех сессий процесса кэш разобранных наборов данных с бюджетом памяти
+# и вытеснением давно не использованных. Наборы только читаются: сессии работают
+# со срезами, а при дозагрузке партий получают собственные копии
+class SharedDatasets:
+
+    def __init__(self, max_bytes=SHARED_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    # Набор по ключу; при промахе загружается один раз, даже если его одновременно
+    # запросили несколько сессий
+    def get(self, key, load, size):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+            try:
+                value = load()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            with self._lock:
+                self._entries[key] = (value, size(value))
+                self._evict()
+        return value
+
+    # Вытеснение самых давно использованных наборов; последний загруженный остаётся всегда
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            total -= size
+
+    # Число наборов и занятый ими объём, байт
+    def usage(self):
+        with self._lock:
+            return len(self._entries), sum(size for _, size in self._entries.values())
@@ -0,0 +1,155 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from ingest import CSV_OPTIONS
+
+# Продукты реальной выгрузки пекарни; при большем числе продуктов добавляются «ARTICLE N»
+ARTICLE_NAMES = [
+    'TRADITIONAL BAGUETTE', 'FORMULE SANDWICH', 'CROISSANT', 'PAIN AU CHOCOLAT', 'BAGUETTE', 'BANETTE',
+    'COUPE', 'SPECIAL BREAD', 'CEREAL BAGUETTE', 'CAMPAGNE', 'TARTELETTE', 'BOULE 400G', 'PAIN',
+    'ECLAIR', 'FICELLE', 'PAIN AUX RAISINS', 'BRIOCHE', 'CHAUSSON AUX POMMES', 'COOKIE', 'MILLES FEUILLES',
+]
+
+# Пики покупок в течение дня: (час, разброс в часах, доля покупок)
+INTRADAY_PEAKS = [(8.5, 1.0, 0.45), (12.5, 1.0, 0.35), (17.5, 1.2, 0.20)]
+
+# Часы работы (минуты суток, включительно)
+OPEN_MINUTE = 7 * 60
+CLOSE_MINUTE = 20 * 60
+
+# Множители числа чеков по дням недели (понедельник — воскресенье): среда — выходной,
+# в выходные покупателей больше
+WEEKDAY_FACTORS = np.array([1.0, 0.9, 0.0, 0.95, 1.05, 1.35, 1.6])
+
+# Летний подъём продаж (доля от среднего) и ежегодное повышение цен с января
+SUMMER_AMPLITUDE = 0.3
+YEARLY_PRICE_INCREASE = 0.05
+
+# Среднее число дополнительных позиций в чеке (позиций в чеке — 1 + Пуассон)
+EXTRA_ITEMS = 0.6
+
+# Доля строк возвратов (отрицательное количество)
+RETURN_SHARE = 0.001
+
+# Номер первого чека выгрузки
+FIRST_TICKET = 150040
+
+
+# Названия продуктов и их доли продаж (закон Ципфа: первые продукты — лидеры)
+def article_catalog(articles):
+    names = ARTICLE_NAMES[:articles] + [f'ARTICLE {number}' for number in range(len(ARTICLE_NAMES) + 1, articles + 1)]
+    weights = 1 / np.arange(1, articles + 1) ** 1.1
+    return np.array(names, dtype=object), weights / weights.sum()
+
+
+# Разбор описания пиков из командной строки: «час:разброс:доля,...»
+def parse_peaks(text):
+    return [tuple(float(value) for value in peak.split(':')) for peak in text.split(',')]
+
+
+# Распределение покупок по минутам суток: смесь нормальных пиков в часы работы
+def minute_weights(peaks=INTRADAY_PEAKS):
+    minutes = np.arange(OPEN_MINUTE, CLOSE_MINUTE + 1)
+    weights = np.zeros(len(minutes))
+    for hour, spread, share in peaks:
+        weights += share * np.exp(-0.5 * ((minutes / 60 - hour) / spread) ** 2) / spread
+    return minutes, weights / weights.sum()
+
+
+# Ожидаемое число строк выгрузки при заданном числе чеков в день
+def expected_rows(tickets_per_day, years):
+    days = pd.date_range('2021-01-01', periods=int(round(365.25 * years)), freq='D')
+    factors = WEEKDAY_FACTORS[days.dayofweek].mean()
+    return tickets_per_day * len(days) * factors * (1 + EXTRA_ITEMS)
+
+
+# Число чеков в день, при котором выгрузка займёт примерно rows строк
+def tickets_for_rows(rows, years):
+    return max(1, int(round(rows / expected_rows(1, years))))
+
+
+# Строки выгрузки по блокам дат: чеки дня (число — Пуассон с недельной и годовой
+# сезонностью), время покупки — по пикам дня, позиции чека — различные продукты
+# с долями по Ципфу, цены продукта растут каждый январь
+def iter_sales_frames(tickets_per_day=300, years=2, articles=150, start='2021-01-02', peaks=INTRADAY_PEAKS,
+                      seed=0, chunk_days=28):
+    rng = np.random.default_rng(seed)
+    names, popularity = article_catalog(articles)
+    base_prices = rng.choice([0.9, 1.05, 1.2, 1.5, 2.0, 2.5, 3.5, 4.0, 6.5, 9.0], size=articles)
+    minutes, minute_share = minute_weights(peaks)
+    days = pd.date_range(start, periods=int(round(365.25 * years)), freq='D')
+    first_year = days[0].year
+    times = [f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(24 * 60)]
+    ticket = FIRST_TICKET
+    for block in range(0, len(days), chunk_days):
+        block_days = days[block:block + chunk_days]
+        summer = 1 + SUMMER_AMPLITUDE * np.sin(2 * np.pi * (block_days.dayofyear - 80) / 365.25)
+        tickets = rng.poisson(tickets_per_day * WEEKDAY_FACTORS[block_days.dayofweek] * summer)
+        ticket_day = np.repeat(np.arange(len(block_days)), tickets)
+        ticket_minute = rng.choice(minutes, size=len(ticket_day), p=minute_share)
+        # Номера чеков растут со временем покупки
+        order = np.lexsort((ticket_minute, ticket_day))
+        ticket_day, ticket_minute = ticket_day[order], ticket_minute[order]
+        items = 1 + rng.poisson(EXTRA_ITEMS, size=len(ticket_day))
+        item_ticket = np.repeat(np.arange(len(ticket_day)), items)
+        article = rng.choice(articles, size=len(item_ticket), p=popularity)
+        # Повторы продукта в чеке объединяются в одну позицию
+        keep = np.ones(len(item_ticket), dtype=bool)
+        pairs = pd.Series(item_ticket * np.int64(articles) + article)
+        keep[pairs.duplicated().to_numpy()] = False
+        item_ticket, article = item_ticket[keep], article[keep]
+        quantity = 1 + rng.poisson(0.4, size=len(item_ticket))
+        quantity[rng.random(len(item_ticket)) < RETURN_SHARE] *= -1
+        day = ticket_day[item_ticket]
+        price_years = (block_days.year.to_numpy()[day] - first_year)
+        unit_price = np.round(base_prices[article] * (1 + YEARLY_PRICE_INCREASE) ** price_years, 2)
+        yield pd.DataFrame({
+            'date': pd.Categorical.from_codes(day, block_days.strftime('%d.%m.%Y')),
+            'time': pd.Categorical.from_codes(ticket_minute[item_ticket], times),
+            'ticket_number': ticket + item_ticket,
+            'article': pd.Categorical.from_codes(article, names),
+            'Quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': np.round(unit_price * quantity, 2),
+        })
+        ticket += len(ticket_day)
+
+
+# Запись выгрузки в формате кассы (разделитель «;», Windows-1251, десятичная запятая,
+# безымянный столбец номера строки); возвращает число строк
+def write_sales(path, **options):
+    rows = 0
+    with open(path, 'w', encoding=CSV_OPTIONS['encoding'], newline='') as csv_file:
+        for frame in iter_sales_frames(**options):
+            frame.index = pd.RangeIndex(rows, rows + len(frame))
+            frame.to_csv(csv_file, sep=CSV_OPTIONS['delimiter'], decimal=CSV_OPTIONS['decimal'],
+                         float_format='%.2f', header=rows == 0, lineterminator='\n')
+            rows += len(frame)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синтетическая выгрузка продаж пекарни')
+    parser.add_argument('path', help='файл CSV для записи')
+    scale = parser.add_mutually_exclusive_group()
+    scale.add_argument('--rows', type=float, help='примерное число строк (число чеков в день подбирается)')
+    scale.add_argument('--tickets-per-day', type=int, default=300, help='среднее число чеков в день')
+    parser.add_argument('--years', type=float, default=2, help='длительность истории, лет')
+    parser.add_argument('--articles', type=int, default=150, help='число продуктов')
+    parser.add_argument('--start', default='2021-01-02', help='первая дата выгрузки')
+    parser.add_argument('--peaks', type=parse_peaks, default=INTRADAY_PEAKS,
+                        help='пики покупок в течение дня: «час:разброс:доля,...»')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    tickets = tickets_for_rows(args.rows, args.years) if args.rows else args.tickets_per_day
+    rows = write_sales(args.path, tickets_per_day=tickets, years=args.years, articles=args.articles,
+                       start=args.start, peaks=args.peaks, seed=args.seed)
+    print(f'{args.path}: строк — {rows}, чеков в день — {tickets}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+from features import MINUTES_PER_DAY, day_number
+from ingest import memory_bytes, merged_categories
+
+
+# Ключ сортировки «день * 1440 + минута суток» для строк таблицы
+def time_keys(data):
+    return day_number(data['date'].to_numpy()) * MINUTES_PER_DAY + data['minute'].to_numpy(np.int64)
+
+
+# Индекс транзакций по времени: строки отсортированы по ключу
+# «день * 1440 + минута суток», поэтому окно по датам (и по времени внутри него)
+# всегда является непрерывным диапазоном строк, который находится бинарным поиском.
+# Строки хранятся сегментами, идущими друг за другом по времени: дозагруженные партии
+# становятся новыми сегментами, а прежние не копируются и остаются общими
+# с исходным набором данных. Номера строк сквозные по всем сегментам
+class TimeIndex:
+
+    def __init__(self, data):
+        keys = time_keys(data)
+        order = np.argsort(keys, kind='stable')
+        data = data.take(order).reset_index(drop=True)
+        self.attrs = data.attrs
+        # Общие категории продуктов: дозагрузка только дописывает новые в конец,
+        # поэтому коды в прежних сегментах остаются верными
+        self.article = data['article'].dtype
+        self._set_segments([data], [keys[order]])
+
+    def _set_segments(self, frames, keys):
+        self._offsets = np.cumsum([0] + [len(segment_keys) for segment_keys in keys])
+        for frame, segment_keys, offset in zip(frames, keys, self._offsets):
+            segment_keys.flags.writeable = False
+            # Метки строк нового сегмента — их сквозные номера
+            if len(frame) and frame.index[0] != offset:
+                frame.index = pd.RangeIndex(offset, offset + len(frame))
+        self._frames = frames
+        self._keys = keys
+
+    # Сегмент с продуктами в общих категориях (коды не пересчитываются). Типы категорий
+    # равны при любом порядке категорий, поэтому порядок сравнивается отдельно
+    def _aligned(self, frame):
+        if frame['article'].cat.categories.equals(self.article.categories):
+            return frame
+        return frame.assign(article=pd.Categorical.from_codes(frame['article'].cat.codes, dtype=self.article))
+
+    # Дозагрузка новых строк: пересортировывается только часть индекса, которая
+    # перекрывается с партией по времени (для свежих партий это лишь сама партия).
+    # Соседний сегмент сливается с последним, пока тот не меньше его половины:
+    # сегментов остаётся O(log n), каждая строка копируется O(log n) раз
+    def append(self, rows):
+        if not len(rows):
+            return self
+        keys = time_keys(rows)
+        order = np.argsort(keys, kind='stable')
+        rows = rows.take(order)
+        keys = keys[order]
+        categories = merged_categories(pd.Series([], dtype=self.article), rows['article'])
+        if len(categories) > len(self.article.categories):
+            self.article = pd.CategoricalDtype(categories)
+        rows = rows.assign(article=rows['article'].astype('category').cat.set_categories(self.article.categories))
+        start = self._position(keys[0], 'right')
+        frames, segment_keys = self._frames[:], self._keys[:]
+        if start < len(self):
+            # Сегмент, в который попадает начало партии, делится: его голова остаётся
+            # как есть, хвост и все следующие сегменты сортируются вместе с партией
+            segment = int(np.searchsorted(self._offsets, start, side='right')) - 1
+            split = start - self._offsets[segment]
+            tail = pd.concat([self._aligned(frames[segment].iloc[split:])]
+                             + [self._aligned(frame) for frame in frames[segment + 1:]] + [rows])
+            tail_keys = np.concatenate([segment_keys[segment][split:]] + segment_keys[segment + 1:] + [keys])
+            order = np.argsort(tail_keys, kind='stable')
+            rows, keys = tail.take(order), tail_keys[order]
+            frames, segment_keys = frames[:segment], segment_keys[:segment]
+            if split:
+                frames.append(self._frames[segment].iloc[:split])
+                segment_keys.append(self._keys[segment][:split])
+        frames.append(rows.reset_index(drop=True))
+        segment_keys.append(keys)
+        while len(frames) > 1 and len(frames[-2]) <= 2 * len(frames[-1]):
+            frames[-2:] = [pd.concat([self._aligned(frame) for frame in frames[-2:]], ignore_index=True)]
+            segment_keys[-2:] = [np.concatenate(segment_keys[-2:])]
+        self._set_segments(frames, segment_keys)
+        return self
+
+    # Все строки одной таблицей (при нескольких сегментах — копия)
+    @property
+    def data(self):
+        return self._rows(0, len(self))
+
+    # Объём индекса в памяти, байт
+    def nbytes(self):
+        return sum(memory_bytes(frame) + keys.nbytes for frame, keys in zip(self._frames, self._keys))
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    # Сквозной номер первой строки с ключом не меньше (left) или больше (right) key
+    def _position(self, key, side):
+        return int(sum(np.searchsorted(keys, key, side=side) for keys in self._keys))
+
+    # Части сегментов, попадающие в диапазон сквозных номеров [start, stop)
+    def _parts(self, start, stop):
+        for frame, offset in zip(self._frames, self._offsets):
+            low, high = max(start - offset, 0), min(stop - offset, len(frame))
+            if low < high:
+                yield frame.iloc[low:high]
+
+    # Строки диапазона; в пределах одного сегмента — представление без копирования
+    def _rows(self, start, stop):
+        parts = [self._aligned(part) for part in self._parts(start, stop)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return self._aligned(self._frames[0].iloc[:0])
+        return pd.concat(parts)
+
+    # Значения столбца в диапазоне (у категорий — коды в общих категориях)
+    def _values(self, column, start, stop):
+        parts = [part[column] for part in self._parts(start, stop)]
+        if not parts:
+            return np.array([], dtype=np.int64)
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            return np.concatenate([part.cat.codes.to_numpy() for part in parts])
+        return np.concatenate([part.to_numpy() for part in parts])
+
+    # Строки по сквозным номерам в заданном порядке
+    def _take(self, rows):
+        if len(self._frames) == 1:
+            return self._aligned(self._frames[0].take(rows))
+        segments = np.searchsorted(self._offsets, rows, side='right') - 1
+        order = np.argsort(segments, kind='stable')
+        parts = [self._aligned(self._frames[segment].take(rows[order][segments[order] == segment]
+                                                          - self._offsets[segment]))
+                 for segment in np.unique(segments)]
+        if not parts:
+            return self._aligned(self._frames[0].iloc[:0])
+        return pd.concat(parts).take(np.argsort(order))
+
+    # Границы среза строк с начальной даты/минуты по конечную включительно
+    def positions(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1):
+        low = day_number(pd.Timestamp(start_date).to_datetime64()) * MINUTES_PER_DAY + start_minute
+        high = day_number(pd.Timestamp(end_date).to_datetime64()) * MINUTES_PER_DAY + end_minute
+        start = self._position(low, 'left')
+        end = self._position(high, 'right')
+        return slice(start, max(start, end))
+
+    # Строки окна (в пределах одного сегмента — представление без копирования)
+    def select(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1):
+        rows = self.positions(start_date, end_date, start_minute, end_minute)
+        return self._rows(rows.start, rows.stop)
+
+    # Номера строк окна, отобранных по продуктам (маска по кодам категорий, строки не копируются);
+    # без отбора — срез
+    def _matching(self, start_date, end_date, start_minute, end_minute, articles):
+        rows = self.positions(start_date, end_date, start_minute, end_minute)
+        if not articles:
+            return rows
+        codes = self.article.categories.get_indexer(list(articles))
+        mask = np.isin(self._values('article', rows.start, rows.stop), codes[codes >= 0])
+        return rows.start + np.flatnonzero(mask)
+
+    # Число строк окна без построения самих строк
+    def count(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, articles=None):
+        rows = self._matching(start_date, end_date, start_minute, end_minute, articles)
+        return rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+
+    # Страница строк окна: отбор по продуктам и сортировка по столбцу выполняются
+    # над номерами строк, копируются только строки страницы. Без сортировки — порядок по времени
+    def page(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, articles=None,
+             sort=None, descending=False, offset=0, limit=100):
+        rows = self._matching(start_date, end_date, start_minute, end_minute, articles)
+        if isinstance(rows, slice):
+            if sort is None:
+                # Строки уже упорядочены по времени: страница — срез
+                if descending:
+                    stop = max(rows.stop - offset, rows.start)
+                    return self._rows(max(stop - limit, rows.start), stop).iloc[::-1]
+                start = min(rows.start + offset, rows.stop)
+                return self._rows(start, min(start + limit, rows.stop))
+            rows = np.arange(rows.start, rows.stop)
+        if sort is not None and len(rows):
+            # Значения столбца берутся только по диапазону окна
+            low = rows[0]
+            values = self._values(sort, low, rows[-1] + 1)[rows - low]
+            if sort == 'article':
+                # Категории сравниваются по подписи, а не по коду
+                values = np.argsort(np.argsort(self.article.categories.astype(str)))[values]
+            rows = rows[np.argsort(values, kind='stable')]
+        if descending:
+            rows = rows[::-1]
+        return self._take(rows[offset:offset + limit])
+
+    # Строки окна блоками (срезы без копирования) для выгрузки
+    def iter_rows(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, chunk_size=50_000):
+        rows = self.positions(start_date, end_date, start_minute, end_minute)
+        for start in range(rows.start, rows.stop, chunk_size):
+            yield self._rows(start, min(start + chunk_size, rows.stop))
@@ -0,0 +1,391 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from aggregates import MEASURES, describe_counts, year_bounds
+from features import MINUTES_PER_DAY, MONTH_NAMES, WEEKDAY_NAMES
+from ingest import COLUMN_TYPES
+
+# Расположение локального хранилища истории продаж
+WAREHOUSE_PATH = os.environ.get('BAKERY_WAREHOUSE_PATH', os.path.join('.cache', 'warehouse.sqlite'))
+
+# Транзакция считается дубликатом при совпадении всех ключевых полей и порядкового
+# номера среди одинаковых строк файла (occurrence): один продукт, пробитый в чеке
+# дважды, даёт две строки, а повторная загрузка пересекающейся выгрузки — ни одной.
+# Ключ строится по COALESCE(unit_price, -1): в ограничении UNIQUE значения NULL
+# никогда не совпадают, и строки без цены добавлялись бы при каждой загрузке
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales (
+    date TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    dow INTEGER NOT NULL,
+    ticket_number INTEGER NOT NULL DEFAULT -1,
+    article TEXT NOT NULL,
+    Quantity INTEGER NOT NULL,
+    unit_price REAL,
+    total_price REAL,
+    occurrence INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sales_line
+ON sales (date, minute, ticket_number, article, Quantity, COALESCE(unit_price, -1), occurrence);
+CREATE INDEX IF NOT EXISTS sales_article_date ON sales (article, date);
+-- Агрегатный куб (дата × час × продукт) и частоты цен обновляются триггером
+-- только вставленными строками: дозагрузка партии стоит пропорционально её размеру
+CREATE TABLE IF NOT EXISTS cube (
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    article TEXT NOT NULL,
+    dow INTEGER NOT NULL,
+    Quantity INTEGER NOT NULL,
+    total_price REAL NOT NULL,
+    PRIMARY KEY (date, hour, article)
+);
+CREATE TABLE IF NOT EXISTS prices (
+    unit_price REAL PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS sales_to_cube AFTER INSERT ON sales BEGIN
+    INSERT INTO cube (date, hour, article, dow, Quantity, total_price)
+    VALUES (NEW.date, NEW.minute / 60, NEW.article, NEW.dow, NEW.Quantity, COALESCE(NEW.total_price, 0))
+    ON CONFLICT (date, hour, article) DO UPDATE SET
+        Quantity = Quantity + excluded.Quantity,
+        total_price = total_price + excluded.total_price;
+    INSERT INTO prices (unit_price, count)
+    SELECT NEW.unit_price, 1 WHERE NEW.unit_price IS NOT NULL
+    ON CONFLICT (unit_price) DO UPDATE SET count = count + 1;
+END;
+CREATE TABLE IF NOT EXISTS uploads (
+    digest TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+BACKFILL = """
+INSERT INTO cube (date, hour, article, dow, Quantity, total_price)
+SELECT date, minute / 60, article, dow, SUM(Quantity), SUM(COALESCE(total_price, 0))
+FROM sales GROUP BY date, minute / 60, article;
+INSERT OR REPLACE INTO prices (unit_price, count)
+SELECT unit_price, COUNT(*) FROM sales WHERE unit_price IS NOT NULL GROUP BY unit_price;
+"""
+
+# Перенос базы со старым ключом строки: старая таблица переименовывается, агрегаты
+# удаляются и пересобираются триггером при копировании строк в новую таблицу
+MIGRATION = """
+DROP TRIGGER IF EXISTS sales_to_cube;
+DROP INDEX IF EXISTS sales_article_date;
+DROP TABLE IF EXISTS cube;
+DROP TABLE IF EXISTS prices;
+ALTER TABLE sales RENAME TO sales_previous;
+"""
+
+COLUMNS = ['date', 'minute', 'dow', 'ticket_number', 'article', 'Quantity', 'unit_price', 'total_price']
+
+# Целые столбцы, разрядность которых выбирается по значениям, как при загрузке файла
+INTEGER_COLUMNS = ['ticket_number', 'Quantity']
+
+# Поля, по которым одинаковые строки нумеруются
+LINE_KEY = ['date', 'minute', 'ticket_number', 'article', 'Quantity', 'unit_price']
+
+
+# Постоянное хранилище продаж в SQLite. Фильтры панели выполняются запросами
+# к базе, в pandas попадают только подходящие строки или готовые агрегаты.
+# Методы запросов совпадают с SalesCube, поэтому панель работает с ним так же
+class Warehouse:
+
+    def __init__(self, path=WAREHOUSE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            previous = _sales_columns(connection)
+            migrate = _needs_migration(connection)
+            if migrate:
+                connection.executescript(MIGRATION)
+            connection.executescript(SCHEMA)
+            if migrate:
+                # Строки базы без порядкового номера уже без дубликатов, поэтому номер
+                # каждой — 0; повторы строк без цены, пропущенные старым ключом, отбрасываются
+                copied = ", ".join(COLUMNS + ['occurrence'] if 'occurrence' in previous else COLUMNS)
+                with connection:
+                    connection.execute(f'INSERT OR IGNORE INTO sales ({copied}) SELECT {copied} FROM sales_previous')
+                    connection.execute('DROP TABLE sales_previous')
+            with connection:
+                # Заполнение куба для базы, созданной до появления агрегатных таблиц
+                if connection.execute('SELECT NOT EXISTS (SELECT 1 FROM cube) AND EXISTS (SELECT 1 FROM sales)').fetchone()[0]:
+                    connection.executescript(BACKFILL)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def _scalar(self, sql, params=()):
+        with closing(self._connect()) as connection:
+            return connection.execute(sql, params).fetchone()[0]
+
+    # Условие окна по дате и минуте суток (включительно) и его параметры
+    @staticmethod
+    def _window(start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1):
+        return ('(date, minute) >= (?, ?) AND (date, minute) <= (?, ?)',
+                [_iso(start_date), int(start_minute), _iso(end_date), int(end_minute)])
+
+    # Условие диапазона дат для запросов к кубу
+    @staticmethod
+    def _days(start_date, end_date):
+        return 'date BETWEEN ? AND ?', [_iso(start_date), _iso(end_date)]
+
+    # Был ли файл с таким содержимым уже добавлен
+    def has_upload(self, digest):
+        return self._scalar('SELECT COUNT(*) FROM uploads WHERE digest = ?', (digest,)) > 0
+
+    # Добавление блоков нормализованных строк; дубликаты транзакций отбрасываются
+    def add_chunks(self, digest, chunks, on_progress=None):
+        rows = 0
+        added = 0
+        columns = COLUMNS + ['occurrence']
+        seen = {}
+        with closing(self._connect()) as connection:
+            with connection:
+                for chunk, done in chunks:
+                    stored = _stored(chunk)
+                    stored['occurrence'] = _occurrences(stored, seen)
+                    # rowcount не учитывает изменения, сделанные триггером
+                    added += connection.executemany(
+                        f'INSERT OR IGNORE INTO sales ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                        zip(*(stored[column].tolist() for column in columns))
+                    ).rowcount
+                    rows += len(chunk)
+                    if on_progress is not None:
+                        on_progress(done)
+                connection.execute('INSERT OR REPLACE INTO uploads (digest, rows, added) VALUES (?, ?, ?)',
+                                   (digest, rows, added))
+        return added
+
+    def empty(self):
+        return self._scalar('SELECT NOT EXISTS (SELECT 1 FROM sales)') == 1
+
+    @property
+    def rows(self):
+        return self._scalar('SELECT COUNT(*) FROM sales')
+
+    # Версия данных для ключей кэша: строки только добавляются, поэтому достаточно
+    # наибольшего rowid (поиск по первичному ключу вместо подсчёта всех строк)
+    @property
+    def version(self):
+        return self._scalar('SELECT COALESCE(MAX(rowid), 0) FROM sales')
+
+    def min_date(self):
+        return pd.Timestamp(self._scalar('SELECT MIN(date) FROM cube')).date()
+
+    def max_date(self):
+        return pd.Timestamp(self._scalar('SELECT MAX(date) FROM cube')).date()
+
+    def years(self):
+        return self._query('SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER) AS year FROM cube ORDER BY year')['year']
+
+    # Строки окна, упорядоченные по времени
+    def select(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1):
+        where, params = self._window(start_date, end_date, start_minute, end_minute)
+        data = self._query(f'SELECT {", ".join(COLUMNS)} FROM sales WHERE {where} ORDER BY date, minute', params)
+        return _typed(data)
+
+    # Условие окна с отбором по продуктам
+    def _rows_filter(self, start_date, end_date, start_minute, end_minute, articles):
+        where, params = self._window(start_date, end_date, start_minute, end_minute)
+        if articles:
+            articles = list(articles)
+            where += f' AND article IN ({", ".join("?" * len(articles))})'
+            params += articles
+        return where, params
+
+    # Число строк окна (считается в базе)
+    def count(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, articles=None):
+        where, params = self._rows_filter(start_date, end_date, start_minute, end_minute, articles)
+        return self._scalar(f'SELECT COUNT(*) FROM sales WHERE {where}', params)
+
+    # Страница строк окна: отбор, сортировка, LIMIT и OFFSET выполняются в базе
+    def page(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, articles=None,
+             sort=None, descending=False, offset=0, limit=100):
+        if sort is not None and sort not in COLUMNS:
+            raise ValueError(f'Неизвестный столбец: {sort}')
+        where, params = self._rows_filter(start_date, end_date, start_minute, end_minute, articles)
+        direction = 'DESC' if descending else 'ASC'
+        order = f'{sort} {direction}, ' if sort is not None else ''
+        data = self._query(
+            f'SELECT {", ".join(COLUMNS)} FROM sales WHERE {where} '
+            f'ORDER BY {order}date {direction}, minute {direction} LIMIT ? OFFSET ?',
+            params + [int(limit), int(offset)]
+        )
+        return _typed(data)
+
+    # Строки окна блоками для выгрузки (в памяти только текущий блок)
+    def iter_rows(self, start_date, end_date, start_minute=0, end_minute=MINUTES_PER_DAY - 1, chunk_size=50_000):
+        where, params = self._window(start_date, end_date, start_minute, end_minute)
+        with closing(self._connect()) as connection:
+            for chunk in pd.read_sql_query(f'SELECT {", ".join(COLUMNS)} FROM sales WHERE {where} '
+                                           f'ORDER BY date, minute', connection, params=params, chunksize=chunk_size):
+                yield _typed(chunk)
+
+    # Строки периода для анализа корзины: только дата, минута (чек строк без номера), чек
+    # и продукт продаж с положительным количеством (возвраты отбрасываются в базе)
+    def basket_rows(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        return _typed(self._query(
+            f'SELECT date, minute, ticket_number, article FROM sales WHERE {where} AND Quantity > 0', params))
+
+    # Продажи по продуктам за период
+    def by_article(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        return self._query(
+            f'SELECT article, SUM(Quantity) AS Quantity, SUM(total_price) AS total_price '
+            f'FROM cube WHERE {where} GROUP BY article ORDER BY article', params
+        ).set_index('article')
+
+    # Топ продуктов по количеству или сумме продаж: сортировка и LIMIT выполняются в базе
+    def top(self, column, start_date, end_date, n=10):
+        if column not in MEASURES:
+            raise ValueError(f'Неизвестный показатель: {column}')
+        where, params = self._days(start_date, end_date)
+        return self._query(
+            f'SELECT article, SUM({column}) AS {column} FROM cube WHERE {where} '
+            f'GROUP BY article ORDER BY {column} DESC LIMIT ?', params + [n]
+        )
+
+    # Продажи по дням за период
+    def by_day(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        daily = self._query(
+            f'SELECT date, SUM(Quantity) AS Quantity, SUM(total_price) AS total_price '
+            f'FROM cube WHERE {where} GROUP BY date ORDER BY date', params
+        )
+        daily['date'] = pd.to_datetime(daily['date'])
+        return daily.set_index('date')
+
+    # Выручка по месяцам выбранного года
+    def revenue_by_month(self, year):
+        where, params = self._days(*year_bounds(year))
+        revenue = self._query(
+            f'SELECT CAST(substr(date, 6, 2) AS INTEGER) AS date, SUM(total_price) AS total_price '
+            f'FROM cube WHERE {where} GROUP BY 1 ORDER BY 1', params
+        )
+        revenue['date'] = MONTH_NAMES[revenue['date'].to_numpy(dtype=int)]
+        return revenue
+
+    # Продажи по часам дня за период
+    def by_hour(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        return self._query(
+            f'SELECT hour, SUM(Quantity) AS Quantity, SUM(total_price) AS total_price '
+            f'FROM cube WHERE {where} GROUP BY 1 ORDER BY 1', params
+        ).set_index('hour')
+
+    # Продажи по дням недели за период
+    def by_weekday(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        weekly = self._query(
+            f'SELECT dow, SUM(Quantity) AS Quantity, SUM(total_price) AS total_price '
+            f'FROM cube WHERE {where} GROUP BY dow ORDER BY dow', params
+        )
+        # Пустой результат SQLite приходит столбцами типа object
+        weekly['day_of_week'] = WEEKDAY_NAMES[weekly.pop('dow').to_numpy(dtype=int)]
+        return weekly.set_index('day_of_week')
+
+    # Продажи выбранных продуктов по дням
+    def product_daily(self, products, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        products = list(products)
+        daily = self._query(
+            f'SELECT article, date, SUM(Quantity) AS Quantity FROM cube '
+            f'WHERE {where} AND article IN ({", ".join("?" * len(products))}) '
+            f'GROUP BY article, date ORDER BY article, date', params + products
+        )
+        daily['date'] = pd.to_datetime(daily['date'])
+        return daily
+
+    # Продажи всех продуктов по дням
+    def article_daily(self, start_date, end_date):
+        where, params = self._days(start_date, end_date)
+        daily = self._query(
+            f'SELECT article, date, SUM(Quantity) AS Quantity FROM cube '
+            f'WHERE {where} GROUP BY article, date ORDER BY article, date', params
+        )
+        daily['date'] = pd.to_datetime(daily['date'])
+        return daily
+
+    # Частоты цен, упорядоченные по значению
+    def price_counts(self):
+        counts = self._query('SELECT unit_price, count FROM prices ORDER BY unit_price')
+        return counts.set_index('unit_price')['count']
+
+    def price_description(self):
+        return describe_counts(self.price_counts())
+
+
+# Типы столбцов строк, прочитанных из базы, как у таблицы транзакций (компактная схема
+# ingest.normalize). Пустой результат SQLite приходит столбцами типа object, поэтому
+# приводятся все столбцы, а не только дата и продукт
+def _typed(data):
+    data['date'] = pd.to_datetime(data['date'])
+    data['article'] = data['article'].astype('category')
+    for column, dtype in COLUMN_TYPES.items():
+        if column in data:
+            data[column] = data[column].astype(dtype)
+    for column in INTEGER_COLUMNS:
+        if column in data:
+            data[column] = pd.to_numeric(data[column].astype('int64'), downcast='integer')
+    return data
+
+
+def _iso(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _sales_columns(connection):
+    return [row[1] for row in connection.execute('PRAGMA table_info(sales)')]
+
+
+# Создана ли база со старым ключом строки: без порядкового номера или с ограничением
+# UNIQUE таблицы вместо индекса sales_line
+def _needs_migration(connection):
+    columns = _sales_columns(connection)
+    indexes = [row[1] for row in connection.execute('PRAGMA index_list(sales)')]
+    return bool(columns) and ('occurrence' not in columns or 'sales_line' not in indexes)
+
+
+# Столбцы блока в том виде, в котором они хранятся в базе
+def _stored(chunk):
+    return pd.DataFrame({
+        'date': chunk['date'].dt.strftime('%Y-%m-%d'),
+        'minute': chunk['minute'].astype(int),
+        'dow': chunk['dow'].astype(int),
+        'ticket_number': chunk['ticket_number'].fillna(-1).astype('int64') if 'ticket_number' in chunk else -1,
+        'article': chunk['article'].astype(str),
+        'Quantity': chunk['Quantity'].astype('int64'),
+        'unit_price': chunk['unit_price'].astype(float).round(4),
+        'total_price': chunk['total_price'].astype(float).round(4),
+    }, index=chunk.index)
+
+
+# Порядковые номера одинаковых строк блока (0, 1, ...) с продолжением счёта по всем
+# предыдущим блокам файла: seen — словарь числа вхождений каждой строки, пополняемый
+# по ходу загрузки, поэтому строки нумеруются так же, как при чтении файла целиком,
+# даже если одинаковые строки стоят в несмежных блоках. Пустая цена заменяется на -1,
+# как в ключе sales_line
+def _occurrences(stored, seen):
+    keys = stored[LINE_KEY].fillna({'unit_price': -1.0}).reset_index(drop=True)
+    groups = keys.groupby(LINE_KEY, sort=False)
+    ordinals = groups.cumcount().to_numpy(copy=True)
+    codes = groups.ngroup().to_numpy()
+    lines = list(keys.drop_duplicates().itertuples(index=False, name=None))
+    prior = np.array([seen.get(line, 0) for line in lines], dtype=np.int64)
+    ordinals += prior[codes]
+    seen.update(zip(lines, (prior + np.bincount(codes, minlength=len(lines))).tolist()))
+    return ordinals